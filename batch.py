@@ -0,0 +1,262 @@
+"""Evaluate a single genome on many maps at once.
+
+Fitness measured on one map is noisy, but simulating a genome on K maps one after another
+costs K times as much. Instead, K goombas sharing one genome are run in lockstep, one per
+map; each is called a lane. Their bodies are ordinary goombas, which sense and act as usual
+in their own arenas, but their thinking is done by a single BatchMind: sensor values are
+stacked into arrays over the lanes, and each function tree is walked once, its operators
+applied elementwise with NumPy, to produce the results of all K lanes.
+
+The calls a function makes do not depend on the values it computes, so lanes remain in
+lockstep through function evaluation. Only gene actions depend on values: lanes may call
+different genes, in which case the gene queue holds entries for subsets of the lanes.
+"""
+
+from random import Random
+import numpy as np
+
+from world import Arena, clean_tiles
+from goomba import Goomba, Action, Sensor, Count, EFFECTS
+from genome import Genome
+from functree import Op, OP_FUNCS, FUZZY_OP_FUNCS
+
+
+def lane_div(l, r):
+    with np.errstate(all='ignore'):
+        return np.where(r == 0, l, l / np.where(r == 0, 1, r))
+
+def lane_mod(l, r):
+    with np.errstate(all='ignore'):
+        return np.where(r == 0, l, np.mod(l, np.where(r == 0, 1, r)))
+
+def lane_pow(l, r):
+    l, r = np.broadcast_arrays(np.asarray(l, float), np.asarray(r, float))
+    with np.errstate(all='ignore'):
+        # Negative numbers raised to fractional powers are complex; take the real part.
+        real = (l >= 0) | (r == np.floor(r))
+        result = np.where(real, np.power(l, r), np.power(l.astype(complex), r).real)
+    return np.where(l == 0, 0.0, result)
+
+def lane_fuzzy_equ(l, r, fuzz):
+    return np.fmax(0, fuzz - np.abs(l - r)) / fuzz
+
+def lane_fuzzy_les(l, r, fuzz):
+    return np.fmin(fuzz, np.fmax(0, r - l)) / fuzz
+
+def lane_fuzzy_gre(l, r, fuzz):
+    return np.fmin(fuzz, np.fmax(0, l - r)) / fuzz
+
+# Elementwise equivalents of the operator implementations in functree, keyed by those
+# implementations, since a node's evaluation function need not match its current operator.
+LANE_OP_FUNCS = {OP_FUNCS[Op.Add]: np.add,
+                 OP_FUNCS[Op.Sub]: np.subtract,
+                 OP_FUNCS[Op.Mul]: np.multiply,
+                 OP_FUNCS[Op.Div]: lane_div,
+                 OP_FUNCS[Op.Mod]: lane_mod,
+                 OP_FUNCS[Op.Pow]: lane_pow,
+                 OP_FUNCS[Op.Equ]: lambda l, r: np.equal(l, r) * 1.0,
+                 OP_FUNCS[Op.Les]: lambda l, r: np.less(l, r) * 1.0,
+                 OP_FUNCS[Op.Gre]: lambda l, r: np.greater(l, r) * 1.0}
+
+LANE_FUZZY_OP_FUNCS = {FUZZY_OP_FUNCS[Op.Equ]: lane_fuzzy_equ,
+                       FUZZY_OP_FUNCS[Op.Les]: lane_fuzzy_les,
+                       FUZZY_OP_FUNCS[Op.Gre]: lane_fuzzy_gre}
+
+
+def evaluate_lanes(node, mind):
+    """Evaluate a function tree over the active lanes of a mind.
+
+    Returns an array with a value per active lane, or a scalar common to all of them."""
+    if node.is_leaf():
+        return node(mind)
+
+    if node.folded is not None:
+        return node.folded
+
+    lres = evaluate_lanes(node.left, mind)
+    rres = evaluate_lanes(node.right, mind)
+
+    with np.errstate(all='ignore'):
+        if node.fuzzy:
+            retval = LANE_FUZZY_OP_FUNCS[node._evaluate_](lres, rres, mind.genome.fuzziness)
+        else:
+            retval = LANE_OP_FUNCS[node._evaluate_](lres, rres)
+
+    return np.where(np.isinf(retval), 0.0, retval)
+
+
+class BatchMind:
+    """Thinks for a number of goombas sharing a genome, in lockstep.
+
+    The goombas' sensors, state and memory are read at the start of each thought, and their
+    intent weights, state, memory, expression order and thought counts are updated at its end,
+    exactly as though each had thought for itself."""
+
+    def __init__(self, gen, goombas):
+        self.genome = gen
+        self.goombas = goombas
+        self.num_lanes = len(goombas)
+
+        self.exec_depth = 0
+        self.gene_index = 0
+        self.lanes = np.arange(self.num_lanes)
+
+    def think(self):
+        """Consider the actions of every lane, populating each goomba's intent weights."""
+        all_lanes = np.arange(self.num_lanes)
+
+        self.sensor_values = {}
+        for sensor in [Sensor.Bump, Sensor.Rand, Sensor.Tile,
+                       Sensor.Left, Sensor.Right, Sensor.Front]:
+            self.sensor_values[sensor] = np.array([g.sensors[sensor] for g in self.goombas],
+                                                  float)
+        self.sensor_values[Sensor.PosX] = np.array([g.pos[0] for g in self.goombas], float)
+        self.sensor_values[Sensor.PosY] = np.array([g.pos[1] for g in self.goombas], float)
+        self.sensor_values[Sensor.OriX] = np.array([g.ori[0] for g in self.goombas], float)
+        self.sensor_values[Sensor.OriY] = np.array([g.ori[1] for g in self.goombas], float)
+
+        self.state = np.array([g.state for g in self.goombas], float)
+        self.intent_weights = {e: np.zeros(self.num_lanes) for e in EFFECTS}
+        self.thoughts = np.zeros(self.num_lanes)
+        self.step_cost = np.zeros(self.num_lanes)
+
+        # Each queue entry is a gene index and the lanes which are to run it.
+        self.gene_queue = [(i, all_lanes)
+                           for i in range(min(Goomba.NUM_INIT_FUNS, len(self.genome)))]
+        self.queue_lengths = np.full(self.num_lanes, len(self.gene_queue))
+
+        i = 0
+        while i < len(self.gene_queue):
+            index, self.lanes = self.gene_queue[i]
+            self.run(index, True)
+            i += 1
+        self.lanes = all_lanes
+
+        for lane, gmba in enumerate(self.goombas):
+            gmba.fresh_intent()
+            for effect in EFFECTS:
+                gmba.intent_weights[effect] = float(self.intent_weights[effect][lane])
+            gmba.state = float(self.state[lane])
+            gmba.counts[Count.Thoughts] += int(self.thoughts[lane])
+            gmba.step_cost = self.step_cost[lane]
+
+    def lane_values(self, value):
+        """Broadcast a result to an array over the active lanes."""
+        return np.array(np.broadcast_to(np.asarray(value, float), (len(self.lanes),)))
+
+    def poll_sensor(self, sensor):
+        if sensor in self.sensor_values:
+            return self.sensor_values[sensor][self.lanes]
+        elif sensor == Sensor.State:
+            return self.state[self.lanes]
+        elif sensor == Sensor.Mem:
+            return np.array([self.goombas[lane].peek_memory() for lane in self.lanes], float)
+        return 0
+
+    def call_func(self, offset):
+        return self.run((self.gene_index + offset) % len(self.genome), False)
+
+    def call_gene(self, offset):
+        return self.run((self.gene_index + offset) % len(self.genome), True)
+
+    def run(self, index, act):
+        """Run the gene at index over the active lanes, respecting max recursion depth and
+        each lane's thought budget. Perform the gene's action if act is set."""
+        lanes = self.lanes
+        if self.exec_depth >= Goomba.EXEC_STACK_SIZE:
+            return np.zeros(len(lanes))
+
+        if Goomba.THOUGHT_BUDGET is not None:
+            within = self.step_cost[lanes] < Goomba.THOUGHT_BUDGET
+            if not within.all():
+                retval = np.zeros(len(lanes))
+                if within.any():
+                    self.lanes = lanes[within]
+                    retval[within] = self.run(index, act)
+                    self.lanes = lanes
+                return retval
+
+        gene = self.genome.express(index)
+        self.step_cost[lanes] += gene.cost
+        caller = self.gene_index
+        self.gene_index = index
+        self.exec_depth += 1
+        retval = self.lane_values(evaluate_lanes(gene.function, self))
+        if act:
+            self.gedanken_action(gene.action, retval)
+        self.exec_depth -= 1
+        self.gene_index = caller
+
+        self.thoughts[lanes] += 1
+
+        return retval
+
+    def gedanken_action(self, action, vals):
+        """Hypothesise an action in each active lane, as Goomba.gedanken_action."""
+        if action == Action.Nop:
+            pass
+        elif action in (Action.Call, Action.Promote, Action.Demote):
+            indices = np.round(vals).astype(int) % len(self.genome)
+
+            if action == Action.Call:
+                callers = {}
+                for lane, index in zip(self.lanes, indices):
+                    if self.queue_lengths[lane] < Goomba.GENE_QUEUE_SIZE:
+                        callers.setdefault(index, []).append(lane)
+                        self.queue_lengths[lane] += 1
+                for index, lanes in callers.items():
+                    self.gene_queue.append((index, np.array(lanes)))
+
+            else:
+                for lane, index in zip(self.lanes, indices):
+                    gmba = self.goombas[lane]
+                    order_index = gmba.expr_rank[index]
+                    if action == Action.Promote and order_index != 0:
+                        gmba.swap_order(order_index, order_index - 1)
+                    elif action == Action.Demote and order_index != len(self.genome) - 1:
+                        gmba.swap_order(order_index, order_index + 1)
+
+        elif action == Action.Remember:
+            for lane, val in zip(self.lanes, vals):
+                self.goombas[lane].memory.append(float(val))
+                self.goombas[lane].mem_pushes += 1
+        elif action == Action.Forget:
+            for lane in self.lanes:
+                if len(self.goombas[lane].memory) > 0:
+                    self.goombas[lane].memory.pop()
+        elif action == Action.SetState:
+            self.state[self.lanes] = vals
+        else:
+            self.intent_weights[action][self.lanes] += vals
+
+
+def evaluate_genome(sequences, maps, steps, seed=0, aggregate=np.median):
+    """Evaluate a genome sequence pair on each of a list of maps, in lockstep.
+
+    The goomba on the kth map starts on a clean tile and draws from a generator seeded with
+    seed + k. Returns the aggregate of the per-map scores (by default their median, which is
+    robust to the occasional unlucky map), the per-map scores, and an array of the per-map
+    counts, indexed by map and Count."""
+    gen = Genome(*sequences)
+
+    goombas = []
+    arenas = []
+    for k, state in enumerate(maps):
+        rng = Random(seed + k)
+        arenas.append(Arena(state))
+        goombas.append(Goomba(gen, rng.choice(clean_tiles(arenas[-1].state)), rng))
+
+    mind = BatchMind(gen, goombas)
+
+    for _ in range(steps):
+        for gmba, arena in zip(goombas, arenas):
+            gmba.sense(arena)
+        mind.think()
+        for gmba, arena in zip(goombas, arenas):
+            gmba.choose_action()
+            gmba.perform_action(arena)
+
+    scores = [gmba.score() for gmba in goombas]
+    counts = np.array([[gmba.counts[count] for count in list(Count)] for gmba in goombas])
+
+    return aggregate(scores), scores, counts
@@ -0,0 +1,202 @@
+"""Microbenchmarks of the simulation's core kernels, for telling whether a change helped.
+
+Each kernel is timed on fixed genomes: the hand-written seed genome of run.py, and random
+genomes of 10, 100 and 1000 genes, all drawn from fixed seeds. Every benchmark is run REPEATS
+times and its fastest run kept, as the one least disturbed by the rest of the machine.
+Results are written as JSON, mapping each benchmark to its seconds per operation.
+
+    python benchmarks.py results.json
+    python benchmarks.py results.json --baseline baseline.json
+
+Given a baseline, benchmarks slower than it by more than REGRESSION_TOLERANCE are flagged,
+and the exit status is nonzero if any are.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+from random import Random
+from time import perf_counter
+
+from world import World
+from functree import parse_func
+from genome import Genome, cross_genomes
+
+SEED = 1234
+REPEATS = 5
+REGRESSION_TOLERANCE = 0.1
+
+GENOME_SIZES = ["seed", 10, 100, 1000]
+OPERATIONS = 10
+POPULATION = 30
+MAP_DIMENSIONS = (40, 40)
+WORLD_STEPS = 50
+
+# The seed genome and metadata of run.py.
+META = "0.3 0.8 0.8  0.3 0.8 0.8  0.8 0.3 0.8  0.8 0.3 0.8 1.0 -5.0 5.0 3 5.0 2.0 " \
+       "0.1 0.2 0.5 0.5 0.3 2 1 1 1 2 1 1 1 1 1 1 4 4 1 1 1 1 1 1"
+SEED_GENOME = " 12 + 1 $10 | 4 * = 0 % $10 23 * 100 $1 | " \
+              " 5 * 100 $2 | " \
+              " 4 * 90 $4 | 3 * 90 $3 | 1 * 100 $5 | " \
+              " 3 * * 80 $1 $0 | 4 * * 80 $1 - 1 $0 | " \
+              " 1 20 "
+
+
+def benchmark_genome(size):
+    """The sequences of the seed genome, or of a random genome of the given number of genes."""
+    if size == "seed":
+        return [META, SEED_GENOME]
+    return Genome.random_coding(META, size, Random(SEED)).sequences()
+
+def population(sequences, rng, num_goombas=POPULATION):
+    """The sequences of a population of mutants of a genome."""
+    genomes = [Genome(*sequences) for _ in range(num_goombas)]
+    for gen in genomes:
+        gen.mutate(rng)
+    return [gen.sequences() for gen in genomes]
+
+
+# Each benchmark takes the sequences of a genome and a generator, and returns the time taken
+# and the number of operations timed.
+
+def time_parse_func(sequences, rng):
+    # Parsing consumes the token list, so each gene's is copied beforehand.
+    tokens = [list(gene.sequence) for gene in Genome(*sequences).genes]
+    start = perf_counter()
+    for gene_tokens in tokens:
+        parse_func(gene_tokens)
+    return perf_counter() - start, len(tokens)
+
+def time_genome_init(sequences, rng):
+    start = perf_counter()
+    for _ in range(OPERATIONS):
+        Genome(*sequences)
+    return perf_counter() - start, OPERATIONS
+
+def time_genome_mutate(sequences, rng):
+    genomes = [Genome(*sequences) for _ in range(OPERATIONS)]
+    start = perf_counter()
+    for gen in genomes:
+        gen.mutate(rng)
+    return perf_counter() - start, OPERATIONS
+
+def time_cross_genomes(sequences, rng):
+    mum = Genome(*sequences)
+    dad = Genome(*sequences)
+    dad.mutate(rng)
+    start = perf_counter()
+    for _ in range(OPERATIONS):
+        cross_genomes(mum, dad, rng)
+    return perf_counter() - start, OPERATIONS
+
+def time_think(sequences, rng):
+    wrld = World(MAP_DIMENSIONS, [sequences], META, [3, 10], WORLD_STEPS, seed=SEED)
+    gmba = wrld.goombas[0]
+
+    # Only thinking is timed, but the goomba acts, so that it meets new situations.
+    elapsed = 0.0
+    for _ in range(WORLD_STEPS):
+        gmba.sense(wrld)
+        start = perf_counter()
+        gmba.think()
+        elapsed += perf_counter() - start
+        gmba.choose_action()
+        gmba.perform_action(wrld)
+    return elapsed, WORLD_STEPS
+
+def time_world_step(sequences, rng):
+    wrld = World(MAP_DIMENSIONS, population(sequences, rng), META, [3, 10], WORLD_STEPS,
+                 seed=SEED)
+    start = perf_counter()
+    for _ in range(WORLD_STEPS):
+        wrld.step()
+    return perf_counter() - start, WORLD_STEPS
+
+def time_breed_pop(sequences, rng):
+    wrld = World(MAP_DIMENSIONS, population(sequences, rng), META, [3, 10], WORLD_STEPS,
+                 seed=SEED)
+    for _ in range(WORLD_STEPS):
+        wrld.step()
+    start = perf_counter()
+    wrld.breed_pop()
+    return perf_counter() - start, 1
+
+def time_next_gen(sequences, rng):
+    wrld = World(MAP_DIMENSIONS, population(sequences, rng), META, [3, 10], WORLD_STEPS,
+                 seed=SEED)
+    for _ in range(WORLD_STEPS):
+        wrld.step()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = perf_counter()
+        wrld.next_gen()
+        elapsed = perf_counter() - start
+    return elapsed, 1
+
+BENCHMARKS = [("parse_func", time_parse_func),
+              ("Genome.__init__", time_genome_init),
+              ("Genome.mutate", time_genome_mutate),
+              ("cross_genomes", time_cross_genomes),
+              ("Goomba.think", time_think),
+              ("World.step", time_world_step),
+              ("World.breed_pop", time_breed_pop),
+              ("World.next_gen", time_next_gen)]
+
+
+def run_benchmarks():
+    """Run every benchmark on every genome, returning the best seconds per operation of each."""
+    genomes = {size: benchmark_genome(size) for size in GENOME_SIZES}
+
+    results = {}
+    for name, benchmark in BENCHMARKS:
+        for size in GENOME_SIZES:
+            best = None
+            for _ in range(REPEATS):
+                elapsed, operations = benchmark(genomes[size], Random(SEED))
+                per_operation = elapsed / operations
+                if best is None or per_operation < best:
+                    best = per_operation
+
+            key = name + "/" + str(size)
+            results[key] = best
+            print("{:<28} {:>14.9f}".format(key, best))
+
+    return results
+
+def compare(results, baseline):
+    """Print each benchmark's change from the baseline, returning those which regressed."""
+    regressions = []
+    print("{:<28} {:>14} {:>14} {:>9}".format("Benchmark", "Baseline (s)", "Current (s)", "Change"))
+    for key, seconds in results.items():
+        if key not in baseline:
+            continue
+        change = seconds / baseline[key] - 1
+        flag = ""
+        if change > REGRESSION_TOLERANCE:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print("{:<28} {:>14.9f} {:>14.9f} {:>+8.1%}{}".format(
+            key, baseline[key], seconds, change, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the simulation's core kernels.")
+    parser.add_argument("output", help="file to write the results to, as JSON")
+    parser.add_argument("--baseline", help="results to compare against, as written before")
+    args = parser.parse_args()
+
+    results = run_benchmarks()
+    with open(args.output, "w") as out:
+        json.dump(results, out, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        if compare(results, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
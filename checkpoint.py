@@ -0,0 +1,200 @@
+"""Save the state of an evolving world between generations, and resume it later.
+
+A checkpoint is a directory holding two files:
+
+    genomes.bin: an append-only log of every genome saved so far, each stored once as a
+                 length-prefixed, compressed record keyed by a hash of its sequences.
+    state.bin:   a compressed snapshot of everything else: the map, the population's genome
+                 keys and start positions, the champions, the generation and the state of the
+                 world's random generator.
+
+Most genomes in a generation are clones or were already seen, so each checkpoint appends only
+the genomes that are new, and rewrites only the small state file. New genomes are appended
+and flushed to disk before the state file is atomically replaced, and the directory is
+flushed after each replacement, so a crash at any point leaves the last complete checkpoint
+readable. When the log has grown to COMPACT_RATIO times
+the number of genomes in use, it is rewritten to hold just those.
+"""
+
+import hashlib
+import os
+import pickle
+import struct
+import zlib
+
+from world import World
+from goomba import Goomba
+from genome import Genome
+
+RECORD_HEADER = struct.Struct("<I")
+
+
+def genome_key(sequences):
+    """A short hash identifying a genome by its sequences."""
+    return hashlib.blake2b("\0".join(sequences).encode(), digest_size=16).digest()
+
+def pack(obj):
+    return zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+def unpack(data):
+    return pickle.loads(zlib.decompress(data))
+
+def fsync_directory(directory):
+    """Flush a directory's entries to disk, so that files created or renamed in it last."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_atomically(path, data):
+    """Replace the file at path with data, such that it is never seen half-written."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+    fsync_directory(os.path.dirname(path) or ".")
+
+
+class Checkpointer:
+    """Saves world state to, and restores it from, a checkpoint directory."""
+
+    COMPACT_RATIO = 4
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.genomes_path = os.path.join(directory, "genomes.bin")
+        self.state_path = os.path.join(directory, "state.bin")
+        os.makedirs(directory, exist_ok=True)
+
+        self.stored = set(self.read_genomes())
+
+    def exists(self):
+        return os.path.exists(self.state_path)
+
+    def read_genomes(self):
+        """Read the genome log into a dictionary from key to sequences.
+
+        A record cut short by a crash is discarded, along with anything after it."""
+        genomes = {}
+        if not os.path.exists(self.genomes_path):
+            return genomes
+
+        with open(self.genomes_path, "rb") as log:
+            data = log.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            if end > len(data):
+                break
+            key, sequences = unpack(data[offset + RECORD_HEADER.size:end])
+            genomes[key] = sequences
+            offset = end
+
+        if offset < len(data):
+            with open(self.genomes_path, "r+b") as log:
+                log.truncate(offset)
+
+        return genomes
+
+    def save(self, wrld):
+        """Checkpoint a world at the start of a generation."""
+        population = [gmba.genome.sequences() for gmba in wrld.goombas]
+        champions = [champ.genome.sequences() for champ in wrld.top_five]
+
+        live = {}
+        for sequences in population + champions:
+            live[genome_key(sequences)] = sequences
+
+        new_records = []
+        for key, sequences in live.items():
+            if key not in self.stored:
+                record = pack((key, sequences))
+                new_records.append(RECORD_HEADER.pack(len(record)) + record)
+                self.stored.add(key)
+
+        if new_records:
+            created = not os.path.exists(self.genomes_path)
+            with open(self.genomes_path, "ab") as log:
+                log.write(b"".join(new_records))
+                log.flush()
+                os.fsync(log.fileno())
+            if created:
+                fsync_directory(self.directory)
+
+        snapshot = {"dimensions": wrld.dimensions,
+                    "seed_meta": wrld.seed_meta,
+                    "gen_len_range": wrld.gen_len_range,
+                    "gen_time": wrld.gen_time,
+                    "eval_seed": wrld.eval_seed,
+                    "seed": wrld.seed,
+                    "eval_start": getattr(wrld, "eval_start", None),
+                    "generation": wrld.generation,
+                    "initial_state": wrld.initial_state,
+                    "state": [tuple(column) for column in wrld.state],
+                    "goombas": [(genome_key(sequences), gmba.pos, gmba.ori)
+                                for sequences, gmba in zip(population, wrld.goombas)],
+                    "top_five": [(genome_key(sequences), dict(champ.counts))
+                                 for sequences, champ in zip(champions, wrld.top_five)],
+                    "step_histogram": wrld.step_histogram,
+                    "random_state": wrld.rng.getstate()}
+        write_atomically(self.state_path, pack(snapshot))
+
+        if len(self.stored) > Checkpointer.COMPACT_RATIO * len(live):
+            self.compact(live)
+
+    def compact(self, live):
+        """Rewrite the genome log to hold only the given genomes."""
+        records = []
+        for key, sequences in live.items():
+            record = pack((key, sequences))
+            records.append(RECORD_HEADER.pack(len(record)) + record)
+        write_atomically(self.genomes_path, b"".join(records))
+        self.stored = set(live)
+
+    def load(self):
+        """Rebuild the world from the last checkpoint, ready to step its next generation."""
+        with open(self.state_path, "rb") as state_file:
+            snapshot = unpack(state_file.read())
+        genomes = self.read_genomes()
+
+        wrld = World(snapshot["dimensions"],
+                     [genomes[key] for key, _, _ in snapshot["goombas"]],
+                     snapshot["seed_meta"],
+                     snapshot["gen_len_range"],
+                     snapshot["gen_time"],
+                     snapshot["eval_seed"],
+                     snapshot["initial_state"],
+                     snapshot["seed"])
+
+        wrld.generation = snapshot["generation"]
+        wrld.state = [list(column) for column in snapshot["state"]]
+        wrld.step_histogram = snapshot["step_histogram"]
+        if wrld.is_isolated():
+            wrld.eval_start = snapshot["eval_start"]
+
+        for i, (gmba, (_, pos, ori)) in enumerate(zip(wrld.goombas, snapshot["goombas"])):
+            # Restart each goomba's own generator, if it has one, at its generation.
+            rng = wrld.goomba_rng(wrld.generation, i)
+            if rng is not None:
+                gmba.reset(gmba.genome, pos, rng)
+            gmba.pos = pos
+            gmba.ori = ori
+        # Resetting the goombas unfroze any twins.
+        wrld.recall_fitnesses()
+
+        wrld.top_five = []
+        for key, counts in snapshot["top_five"]:
+            champ = Goomba(Genome(*genomes[key]))
+            champ.counts.update(counts)
+            wrld.top_five.append(champ)
+
+        wrld.rng.setstate(snapshot["random_state"])
+        if wrld.stepper is not None:
+            wrld.stepper.start_generation()
+
+        return wrld
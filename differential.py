@@ -0,0 +1,198 @@
+"""Check that an alternative thinking backend behaves exactly as Goomba.think.
+
+Random genomes are run on random maps, once with every goomba thinking for itself through
+the reference interpreter and once with the backend under test, from the same seeds. After
+every step, each goomba's intent weights, chosen action, state, memory, expression order,
+thought count, position, orientation and dirt are compared between the two runs, and the
+first difference is reported along with the genome that produced it.
+
+A backend is a function taking a genome and the goombas sharing it, and returning a function
+which makes every goomba think once. Values are compared to within REL_TOL and ABS_TOL, since
+a backend may compute in floating point where the reference is exact; in particular the
+reference raises integers to integral powers exactly, which no float can represent when the
+result is large. Such powers can also take the reference arbitrarily long, so each genome is
+run in its own process and abandoned after TRIAL_TIMEOUT seconds. Abandoned genomes are
+inconclusive: they are listed, and the check exits with status 2 rather than passing.
+
+    python differential.py --backend batch --genomes 200
+"""
+
+import argparse
+import math
+import sys
+from multiprocessing import get_context
+from random import Random
+
+from world import Arena, clean_tiles, random_map
+from goomba import Goomba, Count, EFFECTS
+from genome import Genome
+from batch import BatchMind
+import benchmarks
+
+GENE_COUNTS = (3, 10)
+MAP_DIMENSIONS = (12, 12)
+LANES = 4
+STEPS = 50
+TRIAL_TIMEOUT = 10.0
+
+REL_TOL = 1e-9
+ABS_TOL = 1e-9
+
+
+def reference_mind(gen, goombas):
+    def think():
+        for gmba in goombas:
+            gmba.think()
+    return think
+
+def batch_mind(gen, goombas):
+    return BatchMind(gen, goombas).think
+
+BACKENDS = {"reference": reference_mind,
+            "batch": batch_mind}
+
+
+def snapshot(gmba):
+    """Everything a step may change about a goomba."""
+    return {"intent_weights": [gmba.intent_weights[effect] for effect in EFFECTS],
+            "intent": gmba.intent,
+            "state": gmba.state,
+            "memory": list(gmba.memory),
+            "expr_order": list(gmba.expr_order),
+            "thoughts": gmba.counts[Count.Thoughts],
+            "pos": gmba.pos,
+            "ori": gmba.ori,
+            "dirt": gmba.counts[Count.Dirt]}
+
+def same(reference, candidate):
+    """Whether two values agree, to within tolerance if numeric."""
+    if isinstance(reference, (list, tuple)):
+        return isinstance(candidate, (list, tuple)) and len(reference) == len(candidate) and \
+            all(same(r, c) for r, c in zip(reference, candidate))
+    try:
+        if math.isnan(reference) and math.isnan(candidate):
+            return True
+        return math.isclose(reference, candidate, rel_tol=REL_TOL, abs_tol=ABS_TOL)
+    except OverflowError:
+        # An integer too large for a float.
+        return reference == candidate
+
+def describe(value):
+    try:
+        text = repr(value)
+    except ValueError:
+        return "a value too large to print"
+    return text if len(text) <= 80 else text[:77] + "..."
+
+
+def compare_trial(make_mind, sequences, maps, steps, seed):
+    """Run a genome on maps under the reference and a backend, returning the first difference
+    as a dictionary, or None if there is none."""
+    runs = []
+    for make in (reference_mind, make_mind):
+        gen = Genome(*sequences)
+        goombas = []
+        arenas = []
+        for k, state in enumerate(maps):
+            rng = Random(seed + k)
+            goombas.append(Goomba(gen, rng.choice(clean_tiles(state)), rng))
+            arenas.append(Arena(state))
+        runs.append((goombas, arenas, make(gen, goombas)))
+
+    for step in range(steps):
+        snapshots = []
+        for goombas, arenas, think in runs:
+            for gmba, arena in zip(goombas, arenas):
+                gmba.sense(arena)
+            try:
+                think()
+            except Exception as e:
+                snapshots.append(e)
+                continue
+            for gmba, arena in zip(goombas, arenas):
+                gmba.choose_action()
+                gmba.perform_action(arena)
+            snapshots.append([snapshot(gmba) for gmba in goombas])
+
+        reference, candidate = snapshots
+        if isinstance(reference, Exception) or isinstance(candidate, Exception):
+            return {"step": step, "lane": None, "field": "exception",
+                    "reference": describe(reference), "candidate": describe(candidate)}
+
+        for lane, (ref, cand) in enumerate(zip(reference, candidate)):
+            for field in ref:
+                if not same(ref[field], cand[field]):
+                    return {"step": step, "lane": lane, "field": field,
+                            "reference": describe(ref[field]),
+                            "candidate": describe(cand[field])}
+
+    return None
+
+def run_trial(make_mind, sequences, maps, steps, seed, conn):
+    conn.send(compare_trial(make_mind, sequences, maps, steps, seed))
+
+def run_differential(backend, num_genomes, steps=STEPS, num_lanes=LANES, seed=0):
+    """Compare a backend with the reference on a number of random genomes.
+
+    Returns the first difference found, including the genome and its trial number, or None,
+    and the numbers of the trials abandoned before it, which are inconclusive.
+    """
+    context = get_context("fork")
+    abandoned = []
+
+    for trial in range(num_genomes):
+        rng = Random(seed + trial)
+        sequences = Genome.random_coding(benchmarks.META, rng.randrange(*GENE_COUNTS),
+                                         rng).sequences()
+        maps = [random_map(MAP_DIMENSIONS, rng) for _ in range(num_lanes)]
+
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_trial,
+                                  args=(BACKENDS[backend], sequences, maps, steps,
+                                        seed + trial, sender),
+                                  daemon=True)
+        process.start()
+        if receiver.poll(TRIAL_TIMEOUT):
+            difference = receiver.recv()
+        else:
+            process.kill()
+            abandoned.append(trial)
+            difference = None
+        process.join()
+
+        if difference is not None:
+            difference["trial"] = trial
+            difference["genome"] = sequences
+            return difference, abandoned
+
+    return None, abandoned
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a thinking backend with Goomba.think.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="batch")
+    parser.add_argument("--genomes", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--lanes", type=int, default=LANES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    difference, abandoned = run_differential(args.backend, args.genomes, args.steps, args.lanes,
+                                             args.seed)
+    if difference is None:
+        if not abandoned:
+            print("No differences in " + str(args.genomes) + " genomes")
+            return
+        print("No differences in {} genomes; inconclusive for {} abandoned after {}s: {}".format(
+            args.genomes - len(abandoned), len(abandoned), TRIAL_TIMEOUT, abandoned))
+        sys.exit(2)
+
+    print("Genome {} differs at step {}, lane {}, in {}:".format(
+        difference["trial"], difference["step"], difference["lane"], difference["field"]))
+    print("  reference: " + difference["reference"])
+    print("  " + args.backend + ": " + difference["candidate"])
+    print("  genome: " + repr(difference["genome"]))
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Score a stream of genomes on standard maps, without running evolution.
+
+Genomes are read as JSON lines, from a file or from stdin, each an object holding the
+genome's "meta" and "main" sequences and optionally an "id". Each genome is evaluated by
+batch.evaluate_genome, on the same maps for the same number of steps, in a pool of worker
+processes. A JSON line is written to stdout for each, in input order, holding its id, its
+score (the median over the maps), its score on each map, and its counts on each map by
+Count. A line which cannot be read or evaluated yields an "error" instead.
+
+A worker which dies, as when a genome exhausts its memory, takes its pool and every line
+pending in it down with it. The pool is then restarted, and each of those lines evaluated
+again alone in it, so that only a line which kills a worker by itself yields an error.
+
+The maps are taken from a map bank, if one is given, or else generated from a seed; either
+way every worker evaluates on the same maps. No more than PENDING_PER_WORKER genomes per
+worker are read ahead of the results written, so memory use does not grow with the input.
+
+    python evaluate.py genomes.jsonl --bank bank.npy --maps 8 --steps 200 > results.jsonl
+    python evaluate.py - --workers 4 < genomes.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from random import Random
+
+from world import random_map
+from goomba import Count
+from batch import evaluate_genome
+from mapbank import MapBank
+
+NUM_MAPS = 8
+MAP_DIMENSIONS = (50, 50)
+STEPS = 200
+PENDING_PER_WORKER = 4
+
+# The maps each worker evaluates on, loaded once when the worker starts.
+maps = None
+
+
+def load_maps(bank_path, num_maps, dimensions, seed):
+    """Load the first num_maps maps of a bank, or generate them from seed if there is none."""
+    global maps
+    if bank_path is not None:
+        bank = MapBank(bank_path)
+        maps = [bank[i] for i in range(min(num_maps, len(bank)))]
+    else:
+        rng = Random(seed)
+        maps = [random_map(dimensions, rng) for _ in range(num_maps)]
+
+def evaluate_line(line, steps, seed):
+    """Evaluate the genome on a line of JSON, returning its result as a dictionary."""
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        return {"id": None, "error": "invalid JSON: " + str(e)}
+
+    result = {"id": entry.get("id")}
+    try:
+        score, scores, counts = evaluate_genome([entry["meta"], entry["main"]], maps, steps,
+                                                seed)
+    except Exception as e:
+        result["error"] = repr(e)
+        return result
+
+    result["score"] = float(score)
+    result["scores"] = [float(map_score) for map_score in scores]
+    result["counts"] = {count.name: counts[:, i].tolist() for i, count in enumerate(Count)}
+    return result
+
+def line_id(line):
+    """The id of the genome on a line of JSON, or None if it cannot be read."""
+    try:
+        return json.loads(line).get("id")
+    except (ValueError, AttributeError):
+        return None
+
+def collect(line, future):
+    """The result of evaluating a line, or an error if the worker evaluating it failed."""
+    try:
+        return future.result()
+    except Exception as e:
+        return {"id": line_id(line), "error": repr(e)}
+
+def broke_pool(future):
+    """Whether a finished evaluation failed because a worker of its pool died."""
+    return isinstance(future.exception(), BrokenProcessPool)
+
+def evaluate_stream(lines, workers, bank_path=None, num_maps=NUM_MAPS,
+                    dimensions=MAP_DIMENSIONS, steps=STEPS, map_seed=0, seed=0):
+    """Evaluate the genome on each nonblank line, yielding results in order as they finish."""
+    def start_pool():
+        return ProcessPoolExecutor(workers, initializer=load_maps,
+                                   initargs=(bank_path, num_maps, dimensions, map_seed))
+
+    def restart_pool():
+        """Replace the broken pool, then evaluate each line it failed alone in the new one."""
+        nonlocal pool
+        # Shutting down waits until every future of the pool has been failed or finished.
+        pool.shutdown()
+        pool = start_pool()
+        for k, (line, future) in enumerate(pending):
+            if broke_pool(future):
+                future = pool.submit(evaluate_line, line, steps, seed)
+                if broke_pool(future):
+                    # This line killed a worker by itself; settle it as failed, so that it is
+                    # not tried again should the pool break before it is collected.
+                    pool.shutdown()
+                    pool = start_pool()
+                    failed = Future()
+                    failed.set_result(collect(line, future))
+                    future = failed
+                pending[k] = (line, future)
+
+    pool = start_pool()
+    pending = deque()
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                future = pool.submit(evaluate_line, line, steps, seed)
+            except BrokenProcessPool:
+                restart_pool()
+                future = pool.submit(evaluate_line, line, steps, seed)
+            pending.append((line, future))
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                if broke_pool(pending[0][1]):
+                    restart_pool()
+                yield collect(*pending.popleft())
+
+        while pending:
+            if broke_pool(pending[0][1]):
+                restart_pool()
+            yield collect(*pending.popleft())
+    finally:
+        pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Score genomes read as JSON lines.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file of genomes as JSON lines, or - for stdin")
+    parser.add_argument("--bank", help="map bank to take the maps from, as from mapbank.py")
+    parser.add_argument("--maps", type=int, default=NUM_MAPS, help="number of maps")
+    parser.add_argument("--size", type=int, nargs=2, default=MAP_DIMENSIONS,
+                        help="dimensions of generated maps")
+    parser.add_argument("--map-seed", type=int, default=0, help="seed of generated maps")
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the goombas' generators, as for batch.evaluate_genome")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    lines = sys.stdin if args.input == "-" else open(args.input)
+    with lines:
+        for result in evaluate_stream(lines, args.workers, args.bank, args.maps,
+                                      tuple(args.size), args.steps, args.map_seed, args.seed):
+            sys.stdout.write(json.dumps(result) + "\n")
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
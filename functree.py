@@ -3,6 +3,7 @@
 See genome.py for explanations of how these work."""
 
 import random
+import weakref
 from math import isinf
 from enum import IntEnum
 import goomba
@@ -32,6 +33,23 @@ OP_STRINGS = {Op.Add: "+",
 
 STRING_OPS = {v: k for k, v in OP_STRINGS.items()}
 
+# Operator implementations are shared module-level functions rather than per-node closures,
+# so that nodes hold no references to the genome or agent that owns them.
+OP_FUNCS = {Op.Add: lambda l, r: l + r,
+            Op.Sub: lambda l, r: l - r,
+            Op.Mul: lambda l, r: l * r,
+            Op.Div: lambda l, r: l if (r == 0) else (l / r),
+            Op.Mod: lambda l, r: l if (r == 0) else (l % r),
+            Op.Pow: lambda l, r: 0 if l == 0 else (l ** r).real,
+            Op.Equ: lambda l, r: l == r,
+            Op.Les: lambda l, r: l < r,
+            Op.Gre: lambda l, r: l > r}
+
+# Fuzzy comparisons additionally take the fuzziness of the evaluating agent's genome.
+FUZZY_OP_FUNCS = {Op.Equ: lambda l, r, fuzz: max(0, (fuzz - abs(l - r))) / fuzz,
+                  Op.Les: lambda l, r, fuzz: min(fuzz, max(0, r - l)) / fuzz,
+                  Op.Gre: lambda l, r, fuzz: min(fuzz, max(0, l - r)) / fuzz}
+
 class RefType(IntEnum):
     """Enumeration of possible reference types for leaf nodes.
 
@@ -51,7 +69,28 @@ REF_DELIMS = {RefType.Pure_Offset_Call: '[',
               RefType.Constant: ''}
 
 
-class FTreeNode(object):
+# Canonical interned nodes, keyed on their structure. Entries vanish with their nodes.
+INTERNED = weakref.WeakValueDictionary()
+
+
+class WeakParent(object):
+    """Mixin storing a tree node's parent as a weak reference.
+
+    Children are owned by their parents; a strong back-reference would put every tree in
+    a reference cycle, keeping it alive until the cyclic garbage collector runs."""
+
+    @property
+    def parent(self):
+        if self._parent is None:
+            return None
+        return self._parent()
+
+    @parent.setter
+    def parent(self, node):
+        self._parent = None if node is None else weakref.ref(node)
+
+
+class FTreeNode(WeakParent):
     """An internal node of a function tree; a binary operator with two children."""
 
     def __init__(self, op, l, r, parent=None):
@@ -60,49 +99,39 @@ class FTreeNode(object):
         self.right = r
         self.parent = parent
 
-        if self.operator == Op.Add:
-            self._evaluate_ = lambda l, r: l + r
-        elif self.operator == Op.Sub:
-            self._evaluate_ = lambda l, r: l - r
-        elif self.operator == Op.Mul:
-            self._evaluate_ = lambda l, r: l * r
-        elif self.operator == Op.Div:
-            self._evaluate_ = lambda l, r: l if (r == 0) else (l / r)
-        elif self.operator == Op.Mod:
-            self._evaluate_ = lambda l, r: l if (r == 0) else (l % r)
-        elif self.operator == Op.Pow:
-            self._evaluate_ = lambda l, r: 0 if l == 0 else (l ** r).real
-        elif self.operator == Op.Equ:
-            self._evaluate_ = lambda l, r: l == r
-        elif self.operator == Op.Les:
-            self._evaluate_ = lambda l, r: l < r
-        elif self.operator == Op.Gre:
-            self._evaluate_ = lambda l, r: l > r
-        else:
-            self._evaluate_ = lambda l, r: 0
+        self._evaluate_ = OP_FUNCS[op]
+        self.fuzzy = False
+        self.interned = False
+        self.folded = None
 
     @classmethod
-    def random(cls, max_depth, gen_len, const_bounds, leaf_weights, parent=None):
+    def random(cls, max_depth, gen_len, const_bounds, leaf_weights, parent=None, rng=random):
         if max_depth <= 1:
-            return FTreeLeaf.random(gen_len, const_bounds, leaf_weights, parent)
+            return FTreeLeaf.random(gen_len, const_bounds, leaf_weights, parent, rng=rng)
 
-        operator = random.choice(list(Op))
+        operator = rng.choice(list(Op))
         node = cls(operator, None, None, parent)
-        node.left = cls.random(random.randrange(max_depth-1),
-                               gen_len, const_bounds, leaf_weights, node)
-        node.right = cls.random(random.randrange(max_depth-1),
-                                gen_len, const_bounds, leaf_weights, node)
+        node.left = cls.random(rng.randrange(max_depth-1),
+                               gen_len, const_bounds, leaf_weights, node, rng=rng)
+        node.right = cls.random(rng.randrange(max_depth-1),
+                                gen_len, const_bounds, leaf_weights, node, rng=rng)
 
         return node
 
     def is_leaf(self):
         return False
 
-    def __call__(self):
-        lres = self.left()
-        rres = self.right()
+    def __call__(self, agent):
+        if self.folded is not None:
+            return self.folded
+
+        lres = self.left(agent)
+        rres = self.right(agent)
         try:
-            retval = self._evaluate_(lres, rres)
+            if self.fuzzy:
+                retval = self._evaluate_(lres, rres, agent.genome.fuzziness)
+            else:
+                retval = self._evaluate_(lres, rres)
             if isinf(retval):
                 return 0
             return retval
@@ -116,45 +145,64 @@ class FTreeNode(object):
     def as_list(self):
         return self.left.as_list() + [self] + self.right.as_list()
 
-    def copy(self):
-        return FTreeNode(self.operator, self.left.copy(), self.right.copy())
+    def copy(self, parent=None):
+        """Return a private, mutable copy of this subtree."""
+        node = FTreeNode(self.operator, None, None, parent)
+        node._evaluate_ = self._evaluate_
+        node.fuzzy = self.fuzzy
+        node.left = self.left.copy(node)
+        node.right = self.right.copy(node)
+        return node
 
     def size(self):
         return 1 + self.left.size() + self.right.size()
 
-class FTreeLeaf(object):
-    """Function tree leaf node containing a callable object returning an arbitrary value."""
+    def depth(self):
+        return 1 + max(self.left.depth(), self.right.depth())
+
+class FTreeLeaf(WeakParent):
+    """Function tree leaf node returning a constant, a sensor value, or the result of a call.
+
+    The ref of a non-constant leaf is resolved by Genome.link: a sensor for sensor leaves,
+    or the integral offset of the referenced gene for offset calls. Offsets are resolved
+    relative to the executing gene by the agent, so a subtree means the same thing wherever
+    in a genome it appears."""
 
     def __init__(self, ref, ref_type, val, parent=None):
         self.ref = ref
         self.ref_type = ref_type
         self.val = val
         self.parent = parent
+        self.interned = False
 
     @classmethod
     def init_const(cls, val, parent=None):
         return cls(None, RefType.Constant, val, parent)
 
     @classmethod
-    def random(cls, gen_len, const_bounds, leaf_weights, parent=None):
-        ref_type = weighted_choice(leaf_weights)
+    def random(cls, gen_len, const_bounds, leaf_weights, parent=None, rng=random):
+        ref_type = weighted_choice(leaf_weights, rng=rng)
 
         if ref_type == RefType.Pure_Offset_Call or ref_type == RefType.Impure_Offset_Call:
-            val = random.randrange(gen_len) * random.choice([-1, 1])
+            val = rng.randrange(gen_len) * rng.choice([-1, 1])
         elif ref_type == RefType.Poll_Sensor:
-            val = random.randrange(len(goomba.Sensor))
+            val = rng.randrange(len(goomba.Sensor))
         else:
-            val = (random.random() * (const_bounds[1]-const_bounds[0])) + const_bounds[0]
+            val = (rng.random() * (const_bounds[1]-const_bounds[0])) + const_bounds[0]
         return cls(None, ref_type, val, parent)
 
 
     def is_leaf(self):
         return True
 
-    def __call__(self):
+    def __call__(self, agent):
         if self.ref_type == RefType.Constant:
             return self.val
-        return self.ref()
+        elif self.ref_type == RefType.Poll_Sensor:
+            return agent.poll_sensor(self.ref)
+        elif self.ref_type == RefType.Pure_Offset_Call:
+            return agent.call_func(self.ref)
+        return agent.call_gene(self.ref)
 
     def __str__(self):
         return REF_DELIMS[self.ref_type] + str(self.val)
@@ -162,12 +210,16 @@ class FTreeLeaf(object):
     def as_list(self):
         return [self]
 
-    def copy(self):
-        return FTreeLeaf(self.ref, self.ref_type, self.val)
+    def copy(self, parent=None):
+        """Return a private, mutable copy of this leaf."""
+        return FTreeLeaf(self.ref, self.ref_type, self.val, parent)
 
     def size(self):
         return 1
 
+    def depth(self):
+        return 1
+
 def parse_func(sequence, parent=None):
     curr_sym = sequence.pop(0)
     node = None
@@ -192,3 +244,50 @@ def parse_func(sequence, parent=None):
         node = FTreeLeaf.init_const(float(curr_sym), parent)
 
     return node
+
+def canonical_symbol(sym):
+    """Return a symbol of a function sequence as its parsed node prints, so that a gene reads
+    the same whether or not its function has been built."""
+    if sym in STRING_OPS:
+        return sym
+    if sym[0] in (REF_DELIMS[RefType.Pure_Offset_Call], REF_DELIMS[RefType.Impure_Offset_Call],
+                  REF_DELIMS[RefType.Poll_Sensor]):
+        return sym[0] + str(int(sym[1:]))
+    return str(float(sym))
+
+def intern_func(node):
+    """Return the canonical shared equivalent of a linked function tree.
+
+    Structurally-identical subtrees across the whole population are represented by a single
+    interned node, so identical genes cost their memory only once. Interned nodes have no
+    parent and must never be modified: mutate a copy instead. Non-fuzzy subtrees containing
+    only constants are evaluated once at interning time."""
+    if node.interned:
+        return node
+
+    if node.is_leaf():
+        key = (node.ref_type, type(node.val), node.val)
+    else:
+        node.left = intern_func(node.left)
+        node.right = intern_func(node.right)
+        key = (node.operator, node._evaluate_, node.left, node.right)
+
+    canonical = INTERNED.get(key)
+    if canonical is None:
+        canonical = node
+        canonical.parent = None
+        canonical.interned = True
+
+        if not node.is_leaf() and not node.fuzzy and \
+           is_constant(node.left) and is_constant(node.right):
+            node.folded = node(None)
+
+        INTERNED[key] = canonical
+
+    return canonical
+
+def is_constant(node):
+    """Whether a function tree evaluates to the same value for every agent."""
+    if node.is_leaf():
+        return node.ref_type == RefType.Constant
+    return node.folded is not None
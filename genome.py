@@ -59,8 +59,8 @@ Coding Region: This is a sequence of individual genes.
         Constants: when evaluated simply return the value they contain.
                    In the genome, these simply appear as numbers.
 
-        Sensors: their references are functions returning the state of the sensor determined by
-                 this leaf's value.
+        Sensors: their references are the sensor determined by this leaf's value, whose state
+                 is polled from the evaluating agent.
                  A sensor is denoted by $n in the genome, where n is the sensor number.
 
         Pure Offset Calls: refers to the function inside the gene a number of places down
@@ -81,15 +81,23 @@ Coding Region: This is a sequence of individual genes.
                             Impure calls look like {n in the genome.
 
 
-When a genome is instantiated from a sequence, these function trees are built.
-However, if not inside an agent, it's possible to encode infinite recursive loops,
+When a genome is instantiated from a sequence, these function trees are built lazily:
+each gene keeps its token sequence until it is first executed or mutated. The tokens are
+kept as the built tree would print them, so a genome's sequences read the same either way.
+Expressed trees are interned, so that identical subtrees are shared across the population;
+a gene's tree is copied before it is mutated.
+Function trees are evaluated by passing them the agent expressing the genome, which supplies
+sensor values and enforces the maximum stack depth for offset calls; trees hold no references
+to the agent or to other genes, so a discarded agent and its genome are freed immediately.
+Without an agent, it's possible to encode infinite recursive loops,
 and sensors are obviously not hooked up to anything.
 So a genome is non-functional unless expressed by an agent.
 """
 
 import random
 from enum import IntEnum
-from functree import Op, FTreeNode, FTreeLeaf, RefType, parse_func
+from functree import Op, FTreeNode, FTreeLeaf, RefType, REF_DELIMS, OP_FUNCS, \
+    FUZZY_OP_FUNCS, parse_func, canonical_symbol, intern_func
 from util import weighted_choice
 import goomba
 
@@ -141,44 +149,72 @@ class StructMutes(IntEnum):
 
 
 class Gene(object):
-    def __init__(self, action, function):
+    """An action code and the function determining its value.
+
+    A gene may be unexpressed, holding only the token sequence of its function; the tree is
+    built by Genome.express the first time it is needed."""
+
+    def __init__(self, action, function, sequence=None):
         self.function = function
         self.action = action
+        self.sequence = sequence
+
+        # Nodes evaluated by one run of the function, excluding those of the genes it calls.
+        # Kept up to date by the genome as the gene is expressed and linked.
+        self.cost = None
+
+    def is_expressed(self):
+        return self.function is not None
 
     @classmethod
-    def random(cls, max_depth, gen_len, const_bounds, leaf_weights):
-        action = random.choice(list(goomba.Action))
-        function = FTreeNode.random(max_depth, gen_len, const_bounds, leaf_weights)
+    def random(cls, max_depth, gen_len, const_bounds, leaf_weights, rng=random):
+        action = rng.choice(list(goomba.Action))
+        function = FTreeNode.random(max_depth, gen_len, const_bounds, leaf_weights, rng=rng)
         return cls(action, function)
 
-    def evaluate(self):
-        return self.function()
+    def evaluate(self, agent):
+        return self.function(agent)
 
     def __str__(self):
+        if not self.is_expressed():
+            return str(self.action.value) + " " + " ".join(self.sequence)
         return str(self.action.value) + " " + str(self.function)
 
     def size(self):
+        if not self.is_expressed():
+            return len(self.sequence)
         return self.function.size()
 
-    def mutate(self, genome):
-        if random.random() < genome.mute_rates["gene_action"]:
+    def polled_sensors(self):
+        """The set of sensors this gene's function reads, found without expressing it."""
+        if not self.is_expressed():
+            vals = [int(sym[1:]) for sym in self.sequence
+                    if sym[0] == REF_DELIMS[RefType.Poll_Sensor]]
+        else:
+            vals = [node.val for node in self.function.as_list()
+                    if node.is_leaf() and node.ref_type == RefType.Poll_Sensor]
+        return {goomba.Sensor(round(val) % len(goomba.Sensor)) for val in vals}
+
+    def mutate(self, genome, rng):
+        if rng.random() < genome.mute_rates["gene_action"]:
             # Mutate this gene's action
             self.action = mutated_intenum(self.action, goomba.Action,
-                                          1.0, genome.mute_rates["enum_rel"])
+                                          1.0, genome.mute_rates["enum_rel"], rng=rng)
 
-        elif random.random() < genome.mute_rates["struct_mod"]:
+        elif rng.random() < genome.mute_rates["struct_mod"]:
             # Structure-modifying function mutations.
+            self.unshare()
 
             # Select a random node and mutation
-            node = random.choice(self.function.as_list())
-            mute = weighted_choice(genome.mute_rates["struct_rel"])
+            node = rng.choice(self.function.as_list())
+            mute = weighted_choice(genome.mute_rates["struct_rel"], rng=rng)
 
             if mute == StructMutes.SubTree:
                 new_node = FTreeNode.random(round(genome.fun_gen_depth),
                                             len(genome),
                                             genome.const_bounds,
                                             genome.mute_rates["leaf_rel"],
-                                            node.parent)
+                                            node.parent, rng=rng)
                 if node.parent is None:
                     self.function = new_node
                 elif node.parent.left == node:
@@ -187,7 +223,7 @@ class Gene(object):
                     node.parent.right = new_node
 
             elif mute == StructMutes.OpAbove:
-                new_node = FTreeNode(random.choice(list(Op)), None, None, node.parent)
+                new_node = FTreeNode(rng.choice(list(Op)), None, None, node.parent)
                 
                 if node.parent is None:
                     self.function = new_node
@@ -200,9 +236,9 @@ class Gene(object):
                                              len(genome),
                                              genome.const_bounds,
                                              genome.mute_rates["leaf_rel"],
-                                             new_node)
+                                             new_node, rng=rng)
 
-                if random.random() < 0.5:
+                if rng.random() < 0.5:
                     new_node.left = node
                     new_node.right = new_child
                 else:
@@ -222,45 +258,60 @@ class Gene(object):
 
         else:
             # Non-strucure-modifying function mutation
-            
+            self.unshare()
+
             # Select a random node
-            node = random.choice(self.function.as_list())
+            node = rng.choice(self.function.as_list())
 
             if isinstance(node, FTreeNode):
                 # mutate operator
                 node.operator = mutated_intenum(node.operator, Op, 
-                                                1.0, genome.mute_rates["enum_rel"])
+                                                1.0, genome.mute_rates["enum_rel"], rng=rng)
+                # The genome re-fuzzifies the gene once it is mutated
+                node._evaluate_ = OP_FUNCS[node.operator]
+                node.fuzzy = False
             else:
-                if random.random() < genome.mute_rates["leaf_type"]:
+                if rng.random() < genome.mute_rates["leaf_type"]:
                     # mutate the leaf type
 
                     new_type = node.ref_type
                     # Keep trying to mutate until the value actually changes
                     while new_type == node.ref_type:
                         new_type = mutated_intenum(node.ref_type, RefType,
-                                                   1.0, genome.mute_rates["leaf_rel"])
+                                                   1.0, genome.mute_rates["leaf_rel"], rng=rng)
                     if node.ref_type == RefType.Constant:
                         node.val = round(node.val)  # In case mutating from float to int
+                    elif new_type == RefType.Constant:
+                        node.val = float(node.val)  # As the constant reads back
                     node.ref_type = new_type
                     
                 else:
                     # mutate the leaf value
                     if node.ref_type == RefType.Constant:
                         node.val = mutated_num(node.val, 1.0,
-                                               genome, [None, None])
+                                               genome, [None, None], rng=rng)
                     elif node.ref_type in [RefType.Pure_Offset_Call, RefType.Impure_Offset_Call]:
                         node.val = mutated_int_in_range(node.val, 1.0,
                                                         [-len(genome), len(genome)],
-                                                        genome.mute_rates["enum_rel"])
+                                                        genome.mute_rates["enum_rel"], rng=rng)
                     elif node.ref_type == RefType.Poll_Sensor:
                         node.val = mutated_int_in_range(node.val, 1.0,
                                                         [0, len(goomba.Sensor) - 1],
-                                                        genome.mute_rates["enum_rel"])
+                                                        genome.mute_rates["enum_rel"], rng=rng)
 
 
     def copy(self):
+        if not self.is_expressed():
+            return Gene(self.action, None, list(self.sequence))
+        elif self.function.interned:
+            return Gene(self.action, self.function)
         return Gene(self.action, self.function.copy())
 
+    def unshare(self):
+        """Replace an interned function with a private copy, so that it may be modified."""
+        if self.function.interned:
+            self.function = self.function.copy()
+
 class Genome(object):
 
     META_INDICES = {"colors": [0, 12],
@@ -280,6 +331,17 @@ class Genome(object):
                     "enum_rel": [36, 39],
                     "struct_rel": [39, 42]}
 
+    # Share structurally-identical function subtrees between all genomes once expressed.
+    INTERN_FUNCTIONS = True
+
+    # Bloat control, applied as genomes are mutated and crossed; None disables each limit.
+    # No genome may grow past MAX_SIZE function nodes. Past SOFT_MAX_SIZE, growth of a genome
+    # to a given size is permitted only with probability SOFT_MAX_SIZE over that size. No
+    # function tree may grow deeper than MAX_DEPTH.
+    MAX_SIZE = None
+    SOFT_MAX_SIZE = None
+    MAX_DEPTH = None
+
 
     def __init__(self, meta, sequence):
 
@@ -312,28 +374,24 @@ class Genome(object):
         self.mute_rates["struct_rel"] = dict(zip(list(StructMutes),
                                                  Genome.meta_item(meta_genes, "struct_rel")))
 
-        # Now handle the behavioural genes
+        # Now handle the behavioural genes; their functions are expressed on demand.
         gene_sequences = [s.strip().split() for s in sequence.split("|")]
-        self.genes = [Gene(None, None) for _ in range(len(gene_sequences))]
+        self.genes = []
 
-        for i in range(len(self.genes)):
-            action = goomba.Action(int(gene_sequences[i].pop(0)))
-            func = parse_func(gene_sequences[i])
-            self.fuzzify(func)
-            self.genes[i].action = action
-            self.genes[i].function = func
-
-        self.link()
+        for gene_sequence in gene_sequences:
+            action = goomba.Action(int(gene_sequence.pop(0)))
+            self.genes.append(Gene(action, None,
+                                   [canonical_symbol(sym) for sym in gene_sequence]))
 
     @classmethod
-    def random_coding(cls, meta, length):
+    def random_coding(cls, meta, length, rng=random):
         meta_nums = [float(g) for g in meta.strip().split()]
 
         const_bounds = Genome.meta_item(meta_nums, "const_bounds")
         leaf_rel = dict(zip(list(RefType), Genome.meta_item(meta_nums, "leaf_rel")))
         fun_gen_depth = Genome.meta_item(meta_nums, "fun_gen_depth")
 
-        genes = [Gene.random(fun_gen_depth, length, const_bounds, leaf_rel) \
+        genes = [Gene.random(fun_gen_depth, length, const_bounds, leaf_rel, rng=rng) \
                  for _ in range(length)]
 
         g_string = " | ".join(str(gene) for gene in genes)
@@ -375,44 +433,67 @@ class Genome(object):
         return [metastr, mainstr]
 
 
+    def express(self, index):
+        """Return the gene at index, building, fuzzifying and linking its function if need be."""
+        gene = self.genes[index]
+        if not gene.is_expressed():
+            self.express_gene(gene)
+        return gene
+
+    def express_gene(self, gene):
+        """Build, fuzzify and link the function of an unexpressed gene."""
+        gene.function = parse_func(gene.sequence)
+        gene.sequence = None
+        self.fuzzify(gene.function)
+        self.link_func(gene.function)
+        if Genome.INTERN_FUNCTIONS:
+            gene.function = intern_func(gene.function)
+        gene.cost = gene.size()
+
     def link(self):
-        for i in range(len(self.genes)):
-            self.link_func(self.genes[i].function, i)
+        for gene in self.genes:
+            if gene.is_expressed():
+                self.link_func(gene.function)
+                if Genome.INTERN_FUNCTIONS:
+                    gene.function = intern_func(gene.function)
+                gene.cost = gene.size()
+
+    def link_func(self, func_node):
+        if func_node.interned:
+            # Interned trees were linked before interning and are immutable.
+            return
 
-    def link_func(self, func_node, index):
         if isinstance(func_node, FTreeNode):
-            self.link_func(func_node.left, index)
-            self.link_func(func_node.right, index)
+            self.link_func(func_node.left)
+            self.link_func(func_node.right)
         elif isinstance(func_node, FTreeLeaf):
-            ref_index = (round(func_node.val) + index) % len(self.genes)
-            if func_node.ref_type == RefType.Pure_Offset_Call:
-                func_node.ref = self.genes[ref_index].function
-            elif func_node.ref_type == RefType.Impure_Offset_Call:
-                func_node.ref = self.genes[ref_index]
+            # Refs are plain offsets or sensors, resolved against the evaluating agent at
+            # call time, so that genes never point at one another or at their agent.
+            if func_node.ref_type in (RefType.Pure_Offset_Call, RefType.Impure_Offset_Call):
+                func_node.ref = round(func_node.val)
+            elif func_node.ref_type == RefType.Poll_Sensor:
+                func_node.ref = goomba.Sensor(round(func_node.val) % len(goomba.Sensor))
 
     def fuzzify(self, func_node):
-        if isinstance(func_node, FTreeNode):
+        if isinstance(func_node, FTreeNode) and not func_node.interned:
             # Replace equality and comparison operators with fuzzy versions
-            if func_node.operator == Op.Equ:
-                func_node._evaluate_ = lambda l, r: max(0, (self.fuzziness - abs(l - r))) / self.fuzziness
-            elif func_node.operator == Op.Les:
-                func_node._evaluate_ = lambda l, r: min(self.fuzziness, max(0, r - l)) / self.fuzziness
-            elif func_node.operator == Op.Gre:
-                func_node._evaluate_ = lambda l, r: min(self.fuzziness, max(0, l - r)) / self.fuzziness
+            if func_node.operator in FUZZY_OP_FUNCS:
+                func_node._evaluate_ = FUZZY_OP_FUNCS[func_node.operator]
+                func_node.fuzzy = True
 
             self.fuzzify(func_node.left)
             self.fuzzify(func_node.right)
 
-    def mutate(self):
+    def mutate(self, rng=random):
         # 1. Iterate through genome, checking each item for mutation
         i = 0
         while i < len(self):
 
             # 2. Check if the gene mutates.
-            rand = random.random()
+            rand = rng.random()
             mutation = None
             if rand < self.mute_rates["genome"]:
-                mutation = weighted_choice(self.mute_rates["genome_rel"])
+                mutation = weighted_choice(self.mute_rates["genome_rel"], rng=rng)
 
               # 3. Apply appropriate mutations, if any.
             if mutation is not None:
@@ -420,14 +501,17 @@ class Genome(object):
                 if mutation == GenomeMutes.Insert:
                     new_gene = Gene.random(round(self.fun_gen_depth),
                                            len(self), self.const_bounds,
-                                           self.mute_rates["leaf_rel"])
-                    self.genes.insert(i, new_gene)
-                    fuzz = i
-                    i += 1
+                                           self.mute_rates["leaf_rel"], rng=rng)
+                    if self.admits(new_gene, 0, rng):
+                        self.genes.insert(i, new_gene)
+                        fuzz = i
+                        i += 1
                 elif mutation == GenomeMutes.Dupe:
-                    self.genes.insert(i, self.genes[i].copy())
-                    fuzz = i
-                    i += 1
+                    new_gene = self.genes[i].copy()
+                    if self.admits(new_gene, 0, rng):
+                        self.genes.insert(i, new_gene)
+                        fuzz = i
+                        i += 1
                 elif mutation == GenomeMutes.Delete:
                     del self.genes[i]
                     i -= 1
@@ -437,15 +521,19 @@ class Genome(object):
                     self.genes[i] = self.genes[swapindex]
                     self.genes[swapindex] = tmp
                 elif mutation == GenomeMutes.MuteGene:
-                    self.genes[i].mutate(self)
-                    fuzz = i
+                    # Mutate a copy, so that the gene is kept if the mutant is too big.
+                    mutant = self.express(i).copy()
+                    mutant.mutate(self, rng)
+                    if self.admits(mutant, self.genes[i].size(), rng):
+                        self.genes[i] = mutant
+                        fuzz = i
 
                 if fuzz != -1:
                     self.fuzzify(self.genes[fuzz].function)
                 
                 # Mutate the colours when a functional mutation occurs, for a visual
                 # indication of genetic distance.
-                self.mutate_colors()
+                self.mutate_colors(rng)
 
             i += 1
 
@@ -457,42 +545,45 @@ class Genome(object):
         self.fuzziness = mutated_num(self.fuzziness, 
                                      self.mute_rates["genome"], 
                                      self,
-                                     [0.001, None])
+                                     [0.001, None], rng=rng)
 
         # const bounds (-inf, inf), but small smaller than large
         self.const_bounds[0] = mutated_num(self.const_bounds[0],
                                            self.mute_rates["genome"],
                                            self,
-                                           [None, None])
+                                           [None, None], rng=rng)
         self.const_bounds[1] = mutated_num(self.const_bounds[1],
                                            self.mute_rates["genome"], 
                                            self,
-                                           [None, None])
+                                           [None, None], rng=rng)
         if self.const_bounds[0] > self.const_bounds[1]:
             self.const_bounds = self.const_bounds[::-1]
 
         # fun gen depth [0.0, 5.0]
         self.fun_gen_depth = mutated_by_factor(self.fun_gen_depth,
-                                               1.7, self.mute_rates["genome"], [0.001, 5.0])
+                                               1.7, self.mute_rates["genome"], [0.001, 5.0],
+                                               rng=rng)
 
         # incr_range [0.0, inf)
         self.incr_range = mutated_num(self.incr_range,
                                       self.mute_rates["genome"], 
                                       self, 
-                                      [0.001, None])
+                                      [0.001, None], rng=rng)
         # mult_range [1.0, inf)
         self.mult_range = mutated_num(self.mult_range, 
                                       self.mute_rates["genome"],
                                       self,
-                                      [1.0, None])
+                                      [1.0, None], rng=rng)
 
         # Colours used to be mutated here.
 
         # mute_rates "mute", "genome" [0.0, 1.0]
         self.mute_rates["mute"] = mutated_by_const(self.mute_rates["mute"],
-                                                   0.04, self.mute_rates["genome"], [0.001, 1.0])
+                                                   0.04, self.mute_rates["genome"], [0.001, 1.0],
+                                                   rng=rng)
         self.mute_rates["genome"] = mutated_by_const(self.mute_rates["genome"],
-                                                     0.04, self.mute_rates["mute"], [0.001, 1.0])
+                                                     0.04, self.mute_rates["mute"], [0.001, 1.0],
+                                                     rng=rng)
 
         # other mute_rates [0.0, inf)
         rel_lists = [self.mute_rates["genome_rel"],
@@ -504,7 +595,7 @@ class Genome(object):
                 rel_list[k] = mutated_num(rel_list[k],
                                           self.mute_rates["mute"],
                                           self,
-                                          [0.001, None])
+                                          [0.001, None], rng=rng)
 
     def __len__(self):
         """Number of genes in the genome."""
@@ -513,61 +604,79 @@ class Genome(object):
     def size(self):
         """Number of function nodes in the genome."""
         return sum(gene.size() for gene in self.genes)
+
+    def admits(self, gene, replaced_size, rng=random):
+        """Whether a gene may join this genome in place of replaced_size nodes' worth of genes,
+        within the limits on genome size and function depth."""
+        if Genome.MAX_DEPTH is not None and gene.is_expressed() and \
+           gene.function.depth() > Genome.MAX_DEPTH:
+            return False
+
+        if Genome.MAX_SIZE is None and Genome.SOFT_MAX_SIZE is None:
+            return True
+        growth = gene.size() - replaced_size
+        if growth <= 0:
+            return True
+        return admits_size(self.size() + growth, rng)
+
+    def polled_sensors(self):
+        """The set of sensors read anywhere in the genome."""
+        return set().union(*(gene.polled_sensors() for gene in self.genes))
         
 
 
-    def mutate_colors(self):
+    def mutate_colors(self, rng=random):
         # colours must reside within [0.0, 1.0]
         # The colour mute rate is high for visual appeal;
         # since no fitness value, would otherwise simply drift
         for col in self.colors:
             for i, _ in enumerate(col[:3]):
-                col[i] = mutated_by_factor(col[i], 1.7, 0.7, [0.0, 1.0])
+                col[i] = mutated_by_factor(col[i], 1.7, 0.7, [0.0, 1.0], rng=rng)
 
-def mutated_by_factor(val, factor, mute_prob, bounds):
-    if random.random() > mute_prob:
+def mutated_by_factor(val, factor, mute_prob, bounds, rng=random):
+    if rng.random() > mute_prob:
         return val
 
-    rfactor = 1.0 + (random.random() * (factor - 1.0))
-    rfactor = random.choice([rfactor, 1.0/rfactor])
+    rfactor = 1.0 + (rng.random() * (factor - 1.0))
+    rfactor = rng.choice([rfactor, 1.0/rfactor])
 
     return max(bounds[0], min(bounds[1], val*rfactor))
 
-def mutated_by_const(val, const, mute_prob, bounds):
-    if random.random() > mute_prob:
+def mutated_by_const(val, const, mute_prob, bounds, rng=random):
+    if rng.random() > mute_prob:
         return val
 
-    rconst = random.random() * const
-    rconst = random.choice([rconst, -rconst])
+    rconst = rng.random() * const
+    rconst = rng.choice([rconst, -rconst])
 
     return max(bounds[0], min(bounds[1], val + rconst))
 
-def mutated_int_in_range(val, mute_prob, rand_bounds, enum_rel):
-    if random.random() > mute_prob:
+def mutated_int_in_range(val, mute_prob, rand_bounds, enum_rel, rng=random):
+    if rng.random() > mute_prob:
         return val
 
-    mute = weighted_choice(enum_rel)
+    mute = weighted_choice(enum_rel, rng=rng)
     if mute == EnumMutes.Increment:
         return val + 1
     elif mute == EnumMutes.Decrement:
         return val - 1
     else:
-        return random.randint(*rand_bounds)
+        return rng.randint(*rand_bounds)
 
 
-def mutated_num(num, mute_prob, genome, clamps):
-    if random.random() > mute_prob:
+def mutated_num(num, mute_prob, genome, clamps, rng=random):
+    if rng.random() > mute_prob:
         return num
 
-    mute = weighted_choice(genome.mute_rates["const_rel"])
+    mute = weighted_choice(genome.mute_rates["const_rel"], rng=rng)
     if mute == ConstMutes.Increment:
-        num += random.random() * genome.incr_range
+        num += rng.random() * genome.incr_range
     elif mute == ConstMutes.Decrement:
-        num -= random.random() * genome.incr_range
+        num -= rng.random() * genome.incr_range
     elif mute == ConstMutes.Incremult: # Assumes mult_range >= 1
-        num *= (random.random() * (genome.mult_range-1)) + 1
+        num *= (rng.random() * (genome.mult_range-1)) + 1
     elif mute == ConstMutes.Decremult:
-        num /= (random.random() * (genome.mult_range-1)) + 1
+        num /= (rng.random() * (genome.mult_range-1)) + 1
 
     if clamps[0] is not None:
         num = max(clamps[0], num)
@@ -576,49 +685,66 @@ def mutated_num(num, mute_prob, genome, clamps):
 
     return num
 
-def mutated_intenum(curr, enum_type, mute_prob, enum_rel):
-    if random.random() > mute_prob:
+def mutated_intenum(curr, enum_type, mute_prob, enum_rel, rng=random):
+    if rng.random() > mute_prob:
         return curr
 
-    mute = weighted_choice(enum_rel)
+    mute = weighted_choice(enum_rel, rng=rng)
     if mute == EnumMutes.Increment:
         return enum_type((curr + 1) % len(enum_type))
     elif mute == EnumMutes.Decrement:
         return enum_type((curr - 1) % len(enum_type))
     else:
-        return random.choice(list(enum_type))
+        return rng.choice(list(enum_type))
+
+
+def admits_size(size, rng=random):
+    """Whether a genome may grow to size nodes, under the hard and soft limits on size."""
+    if Genome.MAX_SIZE is not None and size > Genome.MAX_SIZE:
+        return False
+    if Genome.SOFT_MAX_SIZE is not None and size > Genome.SOFT_MAX_SIZE:
+        return rng.random() < Genome.SOFT_MAX_SIZE / size
+    return True
 
+def sequence_size(main_sequence):
+    """The number of function nodes in a genome's main sequence."""
+    return sum(len(gene.split()) - 1 for gene in main_sequence.split("|"))
 
-def cross_genomes(genome_a, genome_b):
-    return Genome(*cross_genome_sequences(genome_a.sequences(), genome_b.sequences()))
+def cross_genomes(genome_a, genome_b, rng=random):
+    return Genome(*cross_genome_sequences(genome_a.sequences(), genome_b.sequences(), rng=rng))
 
-def cross_genome_sequences(seqs_a, seqs_b):
+def cross_genome_sequences(seqs_a, seqs_b, rng=random):
     meta_a = seqs_a[0].strip().split()
     meta_b = seqs_b[0].strip().split()
-    meta_index = random.randrange(len(meta_a))
+    meta_index = rng.randrange(len(meta_a))
     new_meta = meta_a[:meta_index] + meta_b[meta_index:]
     meta = " ".join(meta_a[:6] + meta_b[6:12] + new_meta[12:])
 
     main_a = seqs_a[1].strip().split("|")
     main_b = seqs_b[1].strip().split("|")
-    main_index = random.randrange(min(len(main_a), len(main_b)))
+    main_index = rng.randrange(min(len(main_a), len(main_b)))
     new_main = main_a[:main_index] + main_b[main_index:]
-    new_main[main_index] = cross_gene_sequences(main_a[main_index], main_b[main_index])
+    new_main[main_index] = cross_gene_sequences(main_a[main_index], main_b[main_index], rng=rng)
     main = " | ".join(new_main)
 
+    size = sequence_size(main)
+    if size > sequence_size(seqs_a[1]) and not admits_size(size, rng):
+        # Too big a child inherits its first parent's genes whole.
+        main = seqs_a[1]
+
     return (meta, main)
 
-def cross_gene_sequences(gene_a, gene_b):
+def cross_gene_sequences(gene_a, gene_b, rng=random):
     atomised_a = gene_a.strip().split()
     atomised_b = gene_b.strip().split()
 
-    new_action = random.choice([atomised_a.pop(0), atomised_b.pop(0)])
+    new_action = rng.choice([atomised_a.pop(0), atomised_b.pop(0)])
 
     func_a = parse_func(atomised_a)
     func_b = parse_func(atomised_b)
 
-    node_a = random.choice(func_a.as_list())
-    node_b = random.choice(func_b.as_list())
+    node_a = rng.choice(func_a.as_list())
+    node_b = rng.choice(func_b.as_list())
 
     if node_a.parent is None:
         return new_action + " " + str(func_b)
@@ -632,6 +758,10 @@ def cross_gene_sequences(gene_a, gene_b):
     while root.parent is not None:
         root = root.parent
 
+    if Genome.MAX_DEPTH is not None and root.depth() > Genome.MAX_DEPTH:
+        # Too deep a cross leaves the first parent's gene as it was.
+        return gene_a
+
     return new_action + " " + str(root)
 
 
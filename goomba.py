@@ -76,10 +76,10 @@
             Additionally, there is a mild encouragement towards a smaller genome.
 """
 
+import random
 from collections import deque
-from random import randint, choice, random
 from enum import IntEnum
-from functree import RefType
+from util import LRUCache
 import world
 import genome
 
@@ -170,6 +170,11 @@ class Goomba:
     GENE_QUEUE_SIZE = 100
     MEM_SIZE = 200
 
+    # The most function nodes a goomba may evaluate in one step, or None for no limit.
+    # Each call to a function is charged its size up front; once the budget is spent,
+    # further calls return 0 as though the stack were full, and count no thoughts.
+    THOUGHT_BUDGET = None
+
     # The scores used to calculate a goomba's fitness.
     COUNT_VALUES = {Count.Dirt: 1000,
                     Count.FwdMoves: -10,
@@ -182,6 +187,13 @@ class Goomba:
                     Count.GenomeSize: -5,
                     Count.TilesCovered: 100}
 
+    # The most a single step can add to a goomba's score: sucking up dirt, or covering a new
+    # tile by moving forward or bumping.
+    MAX_STEP_GAIN = max(0,
+                        COUNT_VALUES[Count.Dirt] + COUNT_VALUES[Count.Sucks],
+                        COUNT_VALUES[Count.TilesCovered] + COUNT_VALUES[Count.FwdMoves],
+                        COUNT_VALUES[Count.TilesCovered] + COUNT_VALUES[Count.Bumps])
+
     # The shape used to display a goomba graphically.
     SHAPE = [(-0.1, 0.3),
              (0.1, 0.3),
@@ -190,80 +202,126 @@ class Goomba:
 
     SUCK_FAIL_PROB = 0.25
 
-    def __init__(self, gen, pos=None):
-        if pos is None:
-            self.pos = (0, 0)
-        else:
-            self.pos = pos
-
-        self.ori = choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+    # Thinking is a pure function of a goomba's situation unless its genome reads its position
+    # or the random sensor. Such goombas may remember the outcome of situations they have
+    # already thought through in a bounded cache of THOUGHT_CACHE_SIZE entries (0 disables it).
+    # If THOUGHT_CACHE_SHARED, all goombas with identical genomes share one cache.
+    THOUGHT_CACHE_SIZE = 0
+    THOUGHT_CACHE_SHARED = False
+    SHARED_THOUGHT_CACHES = LRUCache(256)
+    IMPURE_SENSORS = {Sensor.PosX, Sensor.PosY, Sensor.Rand}
 
+    def __init__(self, gen, pos=None, rng=None):
         self.sensors = {Sensor.Tile: 0,
                         Sensor.Bump: 0,
                         Sensor.Rand: 0,
                         Sensor.Left: 0,
                         Sensor.Front: 0,
                         Sensor.Right: 0}
-        self.state = 0
 
         self.intent_weights = {e: 0 for e in EFFECTS}
-        self.intent = Action.Wait
-
         self.gene_queue = deque([], Goomba.GENE_QUEUE_SIZE)
-        self.exec_depth = 0
         self.memory = deque([], Goomba.MEM_SIZE)
+        self.expr_order = []
+        self.expr_rank = []
+        self.tiles_covered = set()
+        self.counts = {k: 0 for k in list(Count)}
+        self.thought_cache = None
+        self.own_thought_cache = None
+
+        self.reset(gen, pos, rng)
+
+    def reset(self, gen, pos=None, rng=None):
+        """Re-seed this goomba in place with a new genome, reusing its buffers.
+
+        This returns the goomba to the state of a newly-constructed one, so that shells can be
+        recycled between generations rather than reallocated.
+        All of a goomba's random draws are made from rng, by default the global generator."""
+        if pos is None:
+            self.pos = (0, 0)
+        else:
+            self.pos = pos
+
+        self.rng = random if rng is None else rng
+
+        # A frozen goomba is not stepped again this generation; rung counts the rounds
+        # of a racing evaluation it has survived.
+        self.frozen = False
+        self.rung = 0
+
+        self.ori = self.rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+
+        for sensor in self.sensors:
+            self.sensors[sensor] = 0
+        self.state = 0
+
+        self.fresh_intent()
+        self.exec_depth = 0
+        self.gene_index = 0
+        self.memory.clear()
+        self.mem_pushes = 0
 
         self.genome = gen
-        self.express_genome()
-        self.expr_order = list(range(len(self.genome)))
+        self.expr_order[:] = range(len(self.genome))
+        self.expr_rank[:] = range(len(self.genome))
 
-        self.tiles_covered = set()
-        self.counts = {k: 0 for k in list(Count)}
+        self.tiles_covered.clear()
+        for count in self.counts:
+            self.counts[count] = 0
         self.counts[Count.GenomeSize] = self.genome.size()
 
+        self.setup_thought_cache()
+
+        return self
+
+    def setup_thought_cache(self):
+        """Attach a thought cache to this goomba if enabled and its genome permits one."""
+        if Goomba.THOUGHT_CACHE_SIZE <= 0 or \
+           Goomba.IMPURE_SENSORS & self.genome.polled_sensors():
+            self.thought_cache = None
+            return
+
+        # Without forgetting, only the top of memory can influence thought.
+        self.forgetful = any(gene.action == Action.Forget for gene in self.genome.genes)
+
+        if Goomba.THOUGHT_CACHE_SHARED:
+            key = tuple(self.genome.sequences())
+            self.thought_cache = Goomba.SHARED_THOUGHT_CACHES.get(key)
+            if self.thought_cache is None:
+                self.thought_cache = LRUCache(Goomba.THOUGHT_CACHE_SIZE)
+                Goomba.SHARED_THOUGHT_CACHES.put(key, self.thought_cache)
+        else:
+            if self.own_thought_cache is None:
+                self.own_thought_cache = LRUCache(Goomba.THOUGHT_CACHE_SIZE)
+            else:
+                self.own_thought_cache.clear()
+                self.own_thought_cache.size = Goomba.THOUGHT_CACHE_SIZE
+            self.thought_cache = self.own_thought_cache
+
     @classmethod
-    def from_sequences(cls, sequences, pos=None):
+    def from_sequences(cls, sequences, pos=None, rng=None):
         """Construct a Goomba from a genome sequence pair."""
         gen = genome.Genome(*sequences)
-        return cls(gen, pos)
-
-
-    def express_genome(self):
-        """Hook up genome function references so that it can operate within an agent."""
-
-        def make_run_func(ref):
-            return lambda: self.run_func(ref)
-        def make_run_gene(ref):
-            return lambda: self.run_gene(ref)
-
-        sensor_funcs = {Sensor.PosX: (lambda: self.pos[0]),
-                        Sensor.PosY: (lambda: self.pos[1]),
-                        Sensor.OriX: (lambda: self.ori[0]),
-                        Sensor.OriY: (lambda: self.ori[1]),
-                        Sensor.State: (lambda: self.state),
-                        Sensor.Mem: (self.peek_memory),
-                        Sensor.Bump: (lambda: self.sensors[Sensor.Bump]),
-                        Sensor.Tile: (lambda: self.sensors[Sensor.Tile]),
-                        Sensor.Front: (lambda: self.sensors[Sensor.Front]),
-                        Sensor.Left: (lambda: self.sensors[Sensor.Left]),
-                        Sensor.Right: (lambda: self.sensors[Sensor.Right]),
-                        Sensor.Rand: (lambda: self.sensors[Sensor.Rand])}
-
-        for gene in self.genome.genes:
-            func_refs = [n for n in gene.function.as_list() if n.is_leaf()]
-
-            for ref in func_refs:
-                if ref.ref_type == RefType.Pure_Offset_Call:
-                    ref.ref = make_run_func(ref.ref)
-                elif ref.ref_type == RefType.Impure_Offset_Call:
-                    ref.ref = make_run_gene(ref.ref)
-                elif ref.ref_type == RefType.Poll_Sensor:
-                    sensor = Sensor(round(ref.val) % len(Sensor))
-
-                    if sensor in sensor_funcs:
-                        ref.ref = sensor_funcs[sensor]
-                    else:
-                        ref.ref = lambda: 0
+        return cls(gen, pos, rng)
+
+
+    def poll_sensor(self, sensor):
+        """Return the current state of a sensor."""
+        if sensor in self.sensors:
+            return self.sensors[sensor]
+        elif sensor == Sensor.PosX:
+            return self.pos[0]
+        elif sensor == Sensor.PosY:
+            return self.pos[1]
+        elif sensor == Sensor.OriX:
+            return self.ori[0]
+        elif sensor == Sensor.OriY:
+            return self.ori[1]
+        elif sensor == Sensor.State:
+            return self.state
+        elif sensor == Sensor.Mem:
+            return self.peek_memory()
+        return 0
 
     def peek_memory(self):
         """Examine the value at the top of the mem stack, 0 if stack is empty."""
@@ -271,33 +329,55 @@ class Goomba:
             return self.memory[-1]
         return 0
 
-    def run_func(self, func):
-        """Run a pure function, respecting max recursion depth."""
-        if self.exec_depth >= Goomba.EXEC_STACK_SIZE:
+    def call_func(self, offset):
+        """Run the function of the gene offset places along from the one executing."""
+        return self.run_func((self.gene_index + offset) % len(self.genome))
+
+    def call_gene(self, offset):
+        """Run the gene offset places along from the one executing, with its action."""
+        return self.run_gene((self.gene_index + offset) % len(self.genome))
+
+    def run_func(self, index):
+        """Run the function of the gene at index without its action, respecting max recursion depth."""
+        if self.exec_depth >= Goomba.EXEC_STACK_SIZE or self.is_over_budget():
             return 0
 
+        gene = self.genome.express(index)
+        self.step_cost += gene.cost
+        caller = self.gene_index
+        self.gene_index = index
         self.exec_depth += 1
-        retval = func()
+        retval = gene.evaluate(self)
         self.exec_depth -= 1
+        self.gene_index = caller
 
         self.counts[Count.Thoughts] += 1
 
         return retval
 
-    def run_gene(self, gene):
-        """Run a gene's function and execute its action, respecting max recursion depth."""
-        if self.exec_depth >= Goomba.EXEC_STACK_SIZE:
+    def run_gene(self, index):
+        """Run the gene at index and execute its action, respecting max recursion depth."""
+        if self.exec_depth >= Goomba.EXEC_STACK_SIZE or self.is_over_budget():
             return 0
 
+        gene = self.genome.express(index)
+        self.step_cost += gene.cost
+        caller = self.gene_index
+        self.gene_index = index
         self.exec_depth += 1
-        retval = gene.evaluate()
+        retval = gene.evaluate(self)
         self.gedanken_action(gene.action, retval)
         self.exec_depth -= 1
+        self.gene_index = caller
 
         self.counts[Count.Thoughts] += 1
 
         return retval
 
+    def is_over_budget(self):
+        """Whether this goomba has spent its thought budget for the current step."""
+        return Goomba.THOUGHT_BUDGET is not None and self.step_cost >= Goomba.THOUGHT_BUDGET
+
     def gedanken_action(self, action, val):
         """Hypothesise an action.
 
@@ -312,19 +392,18 @@ class Goomba:
             pass
         elif action == Action.Call:
             if len(self.gene_queue) < Goomba.GENE_QUEUE_SIZE:
-                self.gene_queue.append(self.genome.genes[index])
+                self.gene_queue.append(index)
         elif action == Action.Promote:
-            order_index = self.expr_order.index(index)
+            order_index = self.expr_rank[index]
             if order_index != 0:
-                self.expr_order[order_index] = self.expr_order[order_index - 1]
-                self.expr_order[order_index - 1] = index
+                self.swap_order(order_index, order_index - 1)
         elif action == Action.Demote:
-            order_index = self.expr_order.index(index)
+            order_index = self.expr_rank[index]
             if order_index != len(self.genome) - 1:
-                self.expr_order[order_index] = self.expr_order[order_index + 1]
-                self.expr_order[order_index + 1] = index
+                self.swap_order(order_index, order_index + 1)
         elif action == Action.Remember:
             self.memory.append(val)
+            self.mem_pushes += 1
         elif action == Action.Forget:
             if len(self.memory) > 0:
                 self.memory.pop()
@@ -333,10 +412,22 @@ class Goomba:
         else:
             self.intent_weights[action] += val
 
+    def swap_order(self, rank_a, rank_b):
+        """Exchange the genes at two ranks of the expression order.
+
+        expr_rank is the inverse of expr_order, mapping each gene index to its position in the
+        order, so that genes can be located without searching the order."""
+        gene_a = self.expr_order[rank_a]
+        gene_b = self.expr_order[rank_b]
+        self.expr_order[rank_a] = gene_b
+        self.expr_order[rank_b] = gene_a
+        self.expr_rank[gene_a] = rank_b
+        self.expr_rank[gene_b] = rank_a
+
     def sense(self, wrld):
         """World calls me to set sensor vals once per step."""
         self.sensors[Sensor.Tile] = wrld.get_tile(*self.pos)
-        self.sensors[Sensor.Rand] = randint(0, 1)
+        self.sensors[Sensor.Rand] = self.rng.randint(0, 1)
 
         fcoord = (self.pos[0]+self.ori[0], self.pos[1]+self.ori[1])
         lcoord = (self.pos[0]-self.ori[1], self.pos[1]+self.ori[0])
@@ -349,24 +440,103 @@ class Goomba:
     def fresh_intent(self):
         """Reset this goomba's intent weights and expression queue."""
         self.intent = Action.Wait
-        self.intent_weights = {e: 0 for e in EFFECTS}
+        for effect in self.intent_weights:
+            self.intent_weights[effect] = 0
         self.gene_queue.clear()
+        self.step_cost = 0
 
     def think(self):
         """Consider this goomba's actions.
 
+        If this goomba has a thought cache and has been in its current situation before,
+        recall the outcome of that thought instead of thinking it again."""
+
+        if self.thought_cache is None:
+            self.deliberate()
+            return
+
+        situation = self.situation()
+        outcome = self.thought_cache.get(situation)
+
+        if outcome is None:
+            thoughts = self.counts[Count.Thoughts]
+            pushes = self.mem_pushes
+            order = tuple(self.expr_order)
+
+            self.deliberate()
+            outcome = self.mental_outcome(thoughts, pushes, order)
+            self.thought_cache.put(situation, outcome)
+        else:
+            self.recall(outcome)
+
+    def situation(self):
+        """A snapshot of every input which can influence a pure goomba's thinking."""
+        memory = tuple(self.memory) if self.forgetful else self.peek_memory()
+        return (self.sensors[Sensor.Bump],
+                self.sensors[Sensor.Tile],
+                self.sensors[Sensor.Left],
+                self.sensors[Sensor.Right],
+                self.sensors[Sensor.Front],
+                self.ori,
+                self.state,
+                memory,
+                tuple(self.expr_order))
+
+    def mental_outcome(self, thoughts, pushes, order):
+        """Describe the effect of the thought just completed, given the thought count,
+        memory push count and expression order beforehand."""
+        weights = tuple(self.intent_weights[e] for e in EFFECTS)
+
+        if self.forgetful:
+            memory = tuple(self.memory)
+        else:
+            pushed = min(self.mem_pushes - pushes, len(self.memory))
+            memory = tuple(self.memory)[len(self.memory) - pushed:]
+
+        new_order = tuple(self.expr_order)
+        if new_order == order:
+            new_order = None
+
+        return (weights, self.state, memory, new_order, self.counts[Count.Thoughts] - thoughts)
+
+    def recall(self, outcome):
+        """Apply the remembered outcome of a thought in place of thinking it."""
+        weights, state, memory, order, thoughts = outcome
+
+        self.fresh_intent()
+        for effect, weight in zip(EFFECTS, weights):
+            self.intent_weights[effect] = weight
+
+        self.state = state
+
+        if self.forgetful:
+            self.memory.clear()
+            self.memory.extend(memory)
+        else:
+            self.memory.extend(memory)
+            self.mem_pushes += len(memory)
+
+        if order is not None:
+            self.expr_order[:] = order
+            for rank, index in enumerate(order):
+                self.expr_rank[index] = rank
+
+        self.counts[Count.Thoughts] += thoughts
+
+    def deliberate(self):
+        """Think this goomba's actions through.
+
         Populate the expression queue from the expression order,
         run all genes until the queue fills up or there are none left to run.
         This should populate intent_weights."""
 
         self.fresh_intent()
         for i in range(min(Goomba.NUM_INIT_FUNS, len(self.expr_order))):
-            self.gene_queue.append(self.genome.genes[i])
+            self.gene_queue.append(i)
 
         i = 0
-        while i < len(self.gene_queue):
-            gene = self.gene_queue[i]
-            self.run_gene(gene)
+        while i < len(self.gene_queue) and not self.is_over_budget():
+            self.run_gene(self.gene_queue[i])
             i += 1
 
     def choose_action(self):
@@ -435,33 +605,32 @@ class Goomba:
         There is a chance that the tile will be made dirty instead of clean.
         No effect on boundary tiles.
         """
+        failed = self.attempt_suck(wrld)
+        if failed is not None:
+            x, y = self.pos
+            tile_after, dirt_change = suck_effect(wrld.get_tile(x, y), failed,
+                                                  self.counts[Count.Dirt])
+            if tile_after is not None:
+                wrld.set_tile(x, y, tile_after)
+                self.counts[Count.Dirt] += dirt_change
 
+    def attempt_suck(self, wrld):
+        """Count a suck, and decide whether it fails. Returns None if there is nothing to suck."""
         self.counts[Count.Sucks] += 1
         x, y = self.pos
-        tile_before = wrld.get_tile(x, y)
-
-        if wrld.is_in_bounds(x, y) and (tile_before != world.TileState.Boundary):
-            tile_after = world.TileState.Clean
-            if random() < Goomba.SUCK_FAIL_PROB:
-                tile_after = world.TileState.Dirty
 
-            if (tile_before == world.TileState.Clean) and \
-                    (tile_after == world.TileState.Dirty) and \
-               self.counts[Count.Dirt] > 0:
+        if wrld.is_in_bounds(x, y) and (wrld.get_tile(x, y) != world.TileState.Boundary):
+            return self.rng.random() < Goomba.SUCK_FAIL_PROB
+        return None
 
-                wrld.set_tile(x, y, tile_after)
-                self.counts[Count.Dirt] -= 1
-
-            elif (tile_before == world.TileState.Dirty) and \
-                 (tile_after == world.TileState.Clean):
-                wrld.set_tile(x, y, tile_after)
-                self.counts[Count.Dirt] += 1
+    def has_moved(self):
+        return self.counts[Count.FwdMoves] + self.counts[Count.BckwdMoves] > 0
 
     def score(self):
         """Determine the fitness score for this goomba."""
 
         # Motionless goombas are useless.
-        if self.counts[Count.FwdMoves] + self.counts[Count.BckwdMoves] == 0:
+        if not self.has_moved():
             return -9999999999999999999
 
         score = 0
@@ -469,11 +638,32 @@ class Goomba:
             score += self.counts[count]*Goomba.COUNT_VALUES[count]
         return score
 
+    def score_bound(self, steps):
+        """An upper bound on this goomba's score after a further number of steps."""
+        score = 0
+        for count in list(Count):
+            score += self.counts[count]*Goomba.COUNT_VALUES[count]
+        return score + steps*Goomba.MAX_STEP_GAIN
+
+
+def suck_effect(tile_before, failed, dirt):
+    """The effect of a suck on a tile by a goomba holding some dirt: the tile's new state, or
+    None if it is unchanged, and the change in the goomba's dirt."""
+    if failed:
+        if tile_before == world.TileState.Clean and dirt > 0:
+            return world.TileState.Dirty, -1
+    elif tile_before == world.TileState.Dirty:
+        return world.TileState.Clean, 1
+    return None, 0
 
 def breed(mum, dad):
     """Take two goombas and return the result of crossing them."""
-    new_genome = genome.cross_genomes(mum.genome, dad.genome)
-    new_genome.mutate()
-    return Goomba(new_genome)
+    return Goomba(offspring_genome(mum, dad))
+
+def offspring_genome(mum, dad, rng=random):
+    """Take two goombas and return a mutated cross of their genomes."""
+    new_genome = genome.cross_genomes(mum.genome, dad.genome, rng)
+    new_genome.mutate(rng)
+    return new_genome
 
 
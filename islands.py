@@ -0,0 +1,190 @@
+"""Island-model evolution: several worlds evolving in parallel, exchanging their best genomes.
+
+Each island is a World run headless in its own process, with its own map and population.
+The islands are arranged in a ring. Every few generations, each island sends copies of its
+best genomes to the next island and replaces the tail of its own population with those it
+receives from the previous one. Islands explore independently between migrations, which
+preserves diversity, while migration spreads good genomes through the archipelago.
+
+Locally, migrants travel over multiprocessing queues. Given the addresses of the islands,
+they instead travel over sockets, each island receiving over a SocketInbox and sending over a
+SocketOutbox, so that the ring may span several hosts. Islands only accept connections from
+peers which prove that they hold the ring's authkey.
+"""
+
+import os
+import queue
+import random
+import time
+from threading import Thread
+from multiprocessing import Process, Queue
+from multiprocessing.connection import Listener, Client
+
+from world import World
+
+# The position of the seed among the arguments to World.
+SEED_ARG = 7
+
+# Seconds between checks that no island has died while waiting for their reports.
+REPORT_POLL_INTERVAL = 1.0
+
+
+class SocketInbox:
+    """Receives migrants sent to a local address by an island on any host holding authkey.
+
+    Connections are accepted and read on a background thread, since the authentication
+    handshake would otherwise block the sending island until this one next receives."""
+
+    def __init__(self, address, authkey):
+        if not authkey:
+            # Without one, anyone who can reach the address could send pickles to unpickle.
+            raise ValueError("a SocketInbox requires an authkey")
+        self.listener = Listener(address, authkey=authkey)
+        self.received = queue.Queue()
+        Thread(target=self.receive, daemon=True).start()
+
+    def receive(self):
+        conn = self.listener.accept()
+        while True:
+            try:
+                self.received.put(conn.recv())
+            except EOFError:
+                return
+
+    def get(self):
+        return self.received.get()
+
+
+class SocketOutbox:
+    """Sends migrants to the SocketInbox of an island listening at a given address."""
+
+    CONNECT_ATTEMPTS = 60
+    CONNECT_RETRY_DELAY = 1.0
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.conn = None
+
+    def put(self, migrants):
+        if self.conn is None:
+            # The next island may not be listening yet.
+            for attempt in range(SocketOutbox.CONNECT_ATTEMPTS):
+                try:
+                    self.conn = Client(self.address, authkey=self.authkey)
+                    break
+                except ConnectionRefusedError:
+                    if attempt == SocketOutbox.CONNECT_ATTEMPTS - 1:
+                        raise
+                    time.sleep(SocketOutbox.CONNECT_RETRY_DELAY)
+        self.conn.send(migrants)
+
+
+def run_island(world_args, generations, interval, num_migrants, inbox, outbox,
+               index=0, reports=None, quiet=True):
+    """Evolve a world for a number of generations, migrating every interval generations.
+
+    world_args are the arguments to World. Migrants are put to outbox and taken from inbox.
+    On completion, the island's champions are reported to the reports queue, if given, as
+    the island index and a list of (genome sequences, score) pairs."""
+    # Forked islands would otherwise share the parent's generator state.
+    random.seed()
+
+    if quiet:
+        devnull = open(os.devnull, 'w')
+        os.dup2(devnull.fileno(), 1)
+
+    wrld = World(*world_args)
+    while wrld.generation < generations:
+        wrld.step()
+
+        if wrld.steps == 0 and wrld.generation % interval == 0 \
+                and wrld.generation < generations:
+            # Always send before receiving, so that no island in the ring waits on another.
+            outbox.put(wrld.emigrants(num_migrants))
+            wrld.immigrate(inbox.get())
+
+    champions = [(champ.genome.sequences(), champ.score()) for champ in wrld.top_five]
+    if reports is not None:
+        reports.put((index, champions))
+    return champions
+
+
+def island_world_args(world_args, index):
+    """The arguments to World for the island at index: world_args, with the seed, if given,
+    offset by the index, so that seeded islands do not all evolve alike."""
+    args = list(world_args)
+    if len(args) > SEED_ARG and args[SEED_ARG] is not None:
+        args[SEED_ARG] += index
+    return args
+
+
+def run_socket_island(address, next_address, authkey, world_args, generations, interval,
+                      num_migrants, index=0, reports=None, quiet=True):
+    """Run an island of a ring which may span hosts, receiving migrants at address and sending
+    them to the island listening at next_address, as run_island."""
+    return run_island(world_args, generations, interval, num_migrants,
+                      SocketInbox(address, authkey), SocketOutbox(next_address, authkey),
+                      index, reports, quiet)
+
+
+def run_islands(num_islands, world_args, generations, interval=5, num_migrants=2, quiet=True,
+                addresses=None, authkey=None, local=None):
+    """Evolve num_islands worlds in parallel processes, connected in a ring.
+
+    The islands are connected by queues, unless the address of each is given, in which case
+    each island receives at its own address and sends to the next island's. A ring spanning
+    hosts is then run by each host calling this with the same addresses and authkey, and with
+    the indices of the islands it runs as local; by default every island is run here, and an
+    authkey is generated if none is given.
+
+    Returns the champions of the islands run here, as listed by run_island, in island order.
+    Raises ValueError if local is given without addresses, or without an authkey, and
+    RuntimeError if an island fails, stopping the others here."""
+    if local is None:
+        local = range(num_islands)
+        if addresses is not None and authkey is None:
+            authkey = os.urandom(32)
+    elif addresses is None:
+        # The other islands of a ring of queues could never be reached.
+        raise ValueError("islands can only be run separately when given addresses")
+    elif not authkey:
+        raise ValueError("islands run on several hosts need an authkey shared by every host")
+    reports = Queue()
+
+    if addresses is None:
+        queues = [Queue() for _ in range(num_islands)]
+        islands = [Process(target=run_island,
+                           args=(island_world_args(world_args, i), generations, interval,
+                                 num_migrants, queues[i], queues[(i + 1) % num_islands], i,
+                                 reports, quiet))
+                   for i in local]
+    else:
+        islands = [Process(target=run_socket_island,
+                           args=(addresses[i], addresses[(i + 1) % num_islands], authkey,
+                                 island_world_args(world_args, i), generations, interval,
+                                 num_migrants, i, reports, quiet))
+                   for i in local]
+
+    for island in islands:
+        island.start()
+
+    # Drain the reports before joining, since a process will not exit until its queue is read.
+    # An island which dies never reports, and leaves the next waiting on its migrants.
+    results = {}
+    while len(results) < len(islands):
+        try:
+            index, champions = reports.get(timeout=REPORT_POLL_INTERVAL)
+            results[index] = champions
+        except queue.Empty:
+            for i, island in zip(local, islands):
+                if island.exitcode not in (None, 0):
+                    for other in islands:
+                        other.kill()
+                    raise RuntimeError("island " + str(i) + " exited with code " +
+                                       str(island.exitcode))
+
+    for island in islands:
+        island.join()
+
+    return [results[i] for i in local]
@@ -0,0 +1,74 @@
+"""A bank of pre-generated maps, stored in a single memory-mapped .npy file.
+
+Generating a large map tile by tile is slow, and every world or evaluation worker would
+otherwise generate its own. A bank is generated once, all at once, and saved as an array
+indexed [map, x, y] of tile states. Opening it maps the file into memory without reading it,
+so any number of processes may share it and load just the maps they use, by index, and
+every process sees exactly the same maps.
+
+Usage: python mapbank.py <path.npy> <count> <width> <height> [seed]
+"""
+
+import sys
+import numpy as np
+
+from world import TileState
+
+# Relative frequencies of tile states inside the boundary, as in world.random_map.
+TILE_DISTRIB = {TileState.Boundary: 2, TileState.Dirty: 1, TileState.Clean: 7}
+
+
+def generate_maps(count, dimensions, seed=None):
+    """Generate an array of count random maps of the given dimensions, indexed [map, x, y]."""
+    rng = np.random.default_rng(seed)
+    width, height = dimensions
+
+    states = np.array(list(TILE_DISTRIB.keys()), np.int8)
+    weights = np.array(list(TILE_DISTRIB.values()), float)
+    maps = rng.choice(states, size=(count, width, height), p=weights / weights.sum())
+
+    maps[:, 0, :] = TileState.Boundary
+    maps[:, width - 1, :] = TileState.Boundary
+    maps[:, :, 0] = TileState.Boundary
+    maps[:, :, height - 1] = TileState.Boundary
+
+    return maps
+
+def save_bank(path, maps):
+    np.save(path, maps)
+
+
+class MapBank:
+    """A read-only, memory-mapped bank of maps."""
+
+    def __init__(self, path):
+        self.path = path
+        self.maps = np.load(path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.maps)
+
+    def dimensions(self):
+        return self.maps.shape[1:]
+
+    def __getitem__(self, index):
+        """A read-only, zero-copy view of the map at index, indexed [x, y]. Worlds and arenas
+        given one make their own mutable copy of it."""
+        return self.maps[index]
+
+
+def main():
+    if len(sys.argv) < 5:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+
+    path = sys.argv[1]
+    count = int(sys.argv[2])
+    dimensions = (int(sys.argv[3]), int(sys.argv[4]))
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else None
+
+    save_bank(path, generate_maps(count, dimensions, seed))
+
+
+if __name__ == "__main__":
+    main()
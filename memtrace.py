@@ -0,0 +1,110 @@
+"""Account for the memory held by an evolving world, generation by generation.
+
+A MemoryMonitor attached to a world is given the world after each generation has been bred
+and the last discarded. It collects garbage, so that anything still held is genuinely
+reachable, then reports the memory traced by tracemalloc, the bytes allocated by each of
+the simulation's modules, the numbers of live goombas, genomes, genes and tree nodes, and
+the distribution of genome sizes.
+
+Once the population has been replaced, a steady run should hold roughly steady memory. If
+traced memory has grown in each of the last GROWTH_GENERATIONS generations, by more than
+GROWTH_TOLERANCE overall, an alert is printed with the allocation sites which grew most
+in the last generation. The first generation recorded is left out, since tracing begins
+part way through it.
+
+Tracing slows allocation considerably, so a monitor is for diagnosing, not for every run.
+"""
+
+import gc
+import os
+import tracemalloc
+from collections import Counter
+
+from numpy import percentile
+
+import world  # Before goomba, which world imports from
+from goomba import Goomba
+from genome import Genome, Gene
+from functree import FTreeNode, FTreeLeaf, INTERNED
+
+MODULES = ["world.py", "goomba.py", "genome.py", "functree.py"]
+COUNTED_TYPES = [Goomba, Genome, Gene, FTreeNode, FTreeLeaf]
+
+
+class MemoryMonitor:
+    """Reports on a world's memory after each generation, alerting on steady growth."""
+
+    GROWTH_GENERATIONS = 10
+    GROWTH_TOLERANCE = 0.05
+    ALERT_SITES = 10
+
+    def __init__(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.history = None
+        self.snapshot = None
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__),
+             tracemalloc.Filter(False, __file__)])
+
+    def record(self, wrld):
+        """Measure and report memory at the end of a generation."""
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        snapshot = self.take_snapshot()
+        module_bytes = Counter()
+        for stat in snapshot.statistics("filename"):
+            name = os.path.basename(stat.traceback[0].filename)
+            if name in MODULES:
+                module_bytes[name] += stat.size
+
+        live = Counter()
+        for obj in gc.get_objects():
+            for cls in COUNTED_TYPES:
+                if isinstance(obj, cls):
+                    live[cls.__name__] += 1
+
+        sizes = [gmba.genome.size() for gmba in wrld.goombas]
+
+        print("Memory after generation " + str(wrld.generation) + " (MB): " +
+              "{:.1f} traced, {:.1f} peak".format(current / 2**20, peak / 2**20))
+        print("Allocated by module (MB): " +
+              ", ".join("{} {:.1f}".format(name, module_bytes[name] / 2**20)
+                        for name in MODULES))
+        print("Live objects: " +
+              ", ".join("{} {}".format(cls.__name__, live[cls.__name__])
+                        for cls in COUNTED_TYPES) +
+              ", interned subtrees " + str(len(INTERNED)))
+        print("Genome size min, p25, median, p75, max: " +
+              " ".join(str(float(q)) for q in percentile(sizes, [0, 25, 50, 75, 100])))
+        print()
+
+        if self.history is None:
+            self.history = []
+        else:
+            self.history.append(current)
+            if self.is_growing():
+                self.alert(snapshot)
+        self.snapshot = snapshot
+
+    def is_growing(self):
+        """Whether traced memory has grown steadily over the last GROWTH_GENERATIONS."""
+        window = self.history[-(MemoryMonitor.GROWTH_GENERATIONS + 1):]
+        if len(window) <= MemoryMonitor.GROWTH_GENERATIONS:
+            return False
+        steady = all(later > earlier for earlier, later in zip(window, window[1:]))
+        return steady and window[-1] > window[0] * (1 + MemoryMonitor.GROWTH_TOLERANCE)
+
+    def alert(self, snapshot):
+        window = self.history[-(MemoryMonitor.GROWTH_GENERATIONS + 1):]
+        print("Memory alert: traced memory grew from {:.1f} to {:.1f} MB over {} generations"
+              .format(window[0] / 2**20, window[-1] / 2**20, MemoryMonitor.GROWTH_GENERATIONS))
+        if self.snapshot is not None:
+            print("Largest growth in the last generation:")
+            for stat in snapshot.compare_to(self.snapshot, "lineno")[:MemoryMonitor.ALERT_SITES]:
+                print("  " + str(stat))
+        print()
@@ -0,0 +1,62 @@
+"""Stream per-generation metrics to a file, without holding up the simulation.
+
+A MetricsSink accepts flat records, dictionaries of scalar values, and writes them as JSON
+lines or as CSV rows, according to the file's extension. Records are handed to a background
+thread, which writes whatever has accumulated in one batch and then flushes, so emitting a
+record never waits on I/O.
+"""
+
+import csv
+import json
+import queue
+import threading
+
+
+class MetricsSink:
+    """Writes records to a .jsonl or .csv file from a background thread."""
+
+    def __init__(self, path, fmt=None):
+        if fmt is None:
+            fmt = "csv" if path.endswith(".csv") else "jsonl"
+        self.fmt = fmt
+
+        self.file = open(path, "w", newline="")
+        self.records = queue.Queue()
+        self.writer = threading.Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+
+    def emit(self, record):
+        self.records.put(record)
+
+    def close(self):
+        """Write out every record emitted so far, and close the file."""
+        self.records.put(None)
+        self.writer.join()
+        self.file.close()
+
+    def write_records(self):
+        csv_writer = None
+
+        while True:
+            batch = [self.records.get()]
+            while True:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+
+            for record in batch:
+                if record is None:
+                    self.file.flush()
+                    return
+
+                if self.fmt == "csv":
+                    if csv_writer is None:
+                        # The first record's fields name the columns.
+                        csv_writer = csv.DictWriter(self.file, fieldnames=list(record))
+                        csv_writer.writeheader()
+                    csv_writer.writerow(record)
+                else:
+                    self.file.write(json.dumps(record) + "\n")
+
+            self.file.flush()
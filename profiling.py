@@ -0,0 +1,135 @@
+"""Find where a run spends its time, by instrumenting the hot paths of the simulation.
+
+An installed Profiler wraps a fixed set of methods in timers, recording the calls to each and
+the time spent in them, both in total and net of the timed methods they call. It also counts
+the evaluations of genes, by their index in the genome, and the function tree nodes those
+evaluations ran. Nothing is wrapped until install is called, so a run that is not profiled
+pays nothing.
+
+Only the main process is instrumented; goombas stepped by the workers of a ParallelStepper
+go unrecorded.
+
+Results can be printed as a summary table, or written as collapsed stacks for flame graph
+tools: one line per distinct nesting of timed methods, with the time spent in the innermost
+of them, net of any it calls, in microseconds.
+"""
+
+import functools
+from collections import Counter
+from time import perf_counter
+
+from world import World
+from goomba import Goomba
+from genome import Gene, Genome
+
+# The methods timed, outermost first.
+PHASES = [(World, "step"),
+          (World, "next_gen"),
+          (World, "breed_pop"),
+          (World, "start_breeding"),
+          (World, "populate"),
+          (Genome, "mutate"),
+          (Genome, "express_gene"),
+          (Goomba, "sense"),
+          (Goomba, "think"),
+          (Goomba, "choose_action"),
+          (Goomba, "perform_action")]
+
+
+class Profiler:
+    """Times the simulation's phases and counts its gene evaluations while installed."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.total_time = Counter()
+        self.self_time = Counter()
+        self.stack_time = Counter()
+        self.gene_evaluations = Counter()
+        self.node_evaluations = 0
+
+        # The names of the timed methods currently running, and the time spent so far in
+        # the timed methods each has called.
+        self.stack = []
+        self.child_time = []
+
+        self.originals = []
+
+    def install(self):
+        """Wrap the timed methods, and Gene.evaluate, until uninstalled."""
+        if self.originals:
+            return
+
+        for cls, attr in PHASES:
+            original = getattr(cls, attr)
+            self.originals.append((cls, attr, original))
+            setattr(cls, attr, self.timed(cls.__name__ + "." + attr, original))
+
+        evaluate = Gene.evaluate
+        self.originals.append((Gene, "evaluate", evaluate))
+        setattr(Gene, "evaluate", self.counted(evaluate))
+
+    def uninstall(self):
+        for cls, attr, original in reversed(self.originals):
+            setattr(cls, attr, original)
+        self.originals = []
+
+    def timed(self, name, func):
+        stack = self.stack
+        child_time = self.child_time
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack.append(name)
+            child_time.append(0.0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                own = elapsed - child_time.pop()
+                if child_time:
+                    child_time[-1] += elapsed
+
+                self.calls[name] += 1
+                self.total_time[name] += elapsed
+                self.self_time[name] += own
+                self.stack_time[tuple(stack)] += own
+                stack.pop()
+
+        return wrapper
+
+    def counted(self, evaluate):
+        gene_evaluations = self.gene_evaluations
+
+        @functools.wraps(evaluate)
+        def wrapper(gene, agent):
+            gene_evaluations[agent.gene_index] += 1
+            self.node_evaluations += gene.cost
+            return evaluate(gene, agent)
+
+        return wrapper
+
+    def print_summary(self, num_genes=10):
+        """Print the timed phases by total time, then the most evaluated gene indices."""
+        print("{:<22} {:>10} {:>12} {:>12} {:>12}".format(
+            "Phase", "Calls", "Total (s)", "Self (s)", "Per call (us)"))
+        for name, total in self.total_time.most_common():
+            print("{:<22} {:>10} {:>12.3f} {:>12.3f} {:>12.1f}".format(
+                name, self.calls[name], total, self.self_time[name],
+                total / self.calls[name] * 1e6))
+        print()
+
+        evaluations = sum(self.gene_evaluations.values())
+        print("Gene evaluations: " + str(evaluations))
+        print("Node evaluations: " + str(self.node_evaluations))
+        for index, count in self.gene_evaluations.most_common(num_genes):
+            print("  gene {:<6} {:>12}".format(index, count))
+        print()
+
+    def write_collapsed(self, path):
+        """Write the time spent in each nesting of phases as collapsed stacks."""
+        with open(path, "w") as out:
+            for stack, seconds in sorted(self.stack_time.items()):
+                micros = round(seconds * 1e6)
+                if micros > 0:
+                    out.write(";".join(stack) + " " + str(micros) + "\n")
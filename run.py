@@ -2,13 +2,18 @@
 
 from collections import OrderedDict
 
-import cProfile
 import re
 
 from vispy import app
 import display
 import world
 import genome
+import profiling
+
+# Time the run's phases, printing a summary and writing collapsed stacks to PROFILE_PATH when
+# it is interrupted.
+PROFILE = False
+PROFILE_PATH = "goombas.folded"
 
 def main():
     """Set up the world and run it."""
@@ -66,10 +71,20 @@ def main():
     #canv.show()
     #app.run()
 
-    while True:
-        wrld.step()
+    profiler = None
+    if PROFILE:
+        profiler = profiling.Profiler()
+        profiler.install()
+
+    try:
+        while True:
+            wrld.step()
+    finally:
+        if profiler is not None:
+            profiler.uninstall()
+            profiler.print_summary()
+            profiler.write_collapsed(PROFILE_PATH)
 
 
 if __name__ == "__main__":
     main()
-    #cProfile.run('main()')
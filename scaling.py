@@ -0,0 +1,202 @@
+"""Measure how headless evolution scales with map size, population and generation length.
+
+Each combination of settings in the grid is run in a fresh process, so that its peak
+resident memory is its own, for up to MAX_GENERATIONS generations or TIME_BUDGET seconds,
+whichever comes first. Each run reports its rate of world steps and goomba steps, the
+generations per hour that rate amounts to, and its peak resident memory. The same steps are
+then run again under a profiling.Profiler, whose overhead would otherwise skew the rates, to
+report the time spent in each phase. Combinations whose populations do not fit on their
+maps are skipped, and any whose process dies is reported as failed.
+
+    python scaling.py results.json --plots plots
+
+Results are written as JSON. Given a plot directory, and if matplotlib is installed, each
+metric is plotted against population, with a line for each map size and generation length.
+
+Populations are mutants of the seed genome of run.py, as in benchmarks.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import queue
+import resource
+from multiprocessing import get_context
+from random import Random
+from time import perf_counter
+
+from world import World
+import profiling
+import benchmarks
+
+MAP_SIZES = [50, 200, 500, 1000, 2000]
+POPULATIONS = [30, 100, 300, 1000, 3000, 10000]
+GEN_TIMES = [200, 1000]
+
+TIME_BUDGET = 60.0
+MAX_GENERATIONS = 5
+SEED = 1234
+
+# Seconds between checks that a setting's process has not died while waiting for its record.
+RESULT_POLL_INTERVAL = 1.0
+
+METRICS = ["steps_per_second", "goomba_steps_per_second", "gens_per_hour", "peak_rss_mb"]
+
+
+def run_setting(map_size, population, gen_time, budget, max_generations, results):
+    """Evolve one world headless and put a record of its performance to the results queue.
+
+    Throughput is measured without the profiler. The same number of steps is then run again
+    from the same seed with the profiler installed, to time each phase."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        setup_start = perf_counter()
+        genomes = benchmarks.population(benchmarks.benchmark_genome("seed"), Random(SEED),
+                                        population)
+        try:
+            wrld = World((map_size, map_size), genomes, benchmarks.META, [3, 10], gen_time,
+                         seed=SEED)
+        except ValueError:
+            # There are fewer clean tiles than goombas to start on them.
+            results.put(None)
+            return
+        setup_seconds = perf_counter() - setup_start
+
+        steps = 0
+        start = perf_counter()
+        while perf_counter() - start < budget and wrld.generation < max_generations:
+            wrld.step()
+            steps += 1
+        seconds = perf_counter() - start
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        # Count a generation in progress by the fraction of its steps taken.
+        generations = wrld.generation + wrld.steps / (gen_time + 1)
+        wrld.close()
+
+        wrld = World((map_size, map_size), genomes, benchmarks.META, [3, 10], gen_time,
+                     seed=SEED)
+        profiler = profiling.Profiler()
+        profiler.install()
+        for _ in range(steps):
+            wrld.step()
+        profiler.uninstall()
+        wrld.close()
+
+    results.put({"map_size": map_size,
+                 "population": population,
+                 "gen_time": gen_time,
+                 "setup_seconds": setup_seconds,
+                 "seconds": seconds,
+                 "steps": steps,
+                 "generations": generations,
+                 "steps_per_second": steps / seconds,
+                 "goomba_steps_per_second": steps * population / seconds,
+                 "gens_per_hour": generations * 3600 / seconds,
+                 "peak_rss_mb": peak_rss_mb,
+                 "phase_seconds": dict(profiler.total_time)})
+
+def wait_for_record(process, results):
+    """Take the record put to results by a setting's process, raising RuntimeError if the
+    process exits without putting one."""
+    while True:
+        try:
+            return results.get(timeout=RESULT_POLL_INTERVAL)
+        except queue.Empty:
+            if process.exitcode is not None:
+                break
+    # A record put just before the process exited may still be on its way.
+    try:
+        return results.get(timeout=RESULT_POLL_INTERVAL)
+    except queue.Empty:
+        raise RuntimeError("exited with code " + str(process.exitcode))
+
+def run_grid(map_sizes, populations, gen_times, budget, max_generations):
+    """Run every combination of settings, each in its own process, returning their records."""
+    context = get_context("spawn")
+    results = context.Queue()
+
+    records = []
+    for gen_time in gen_times:
+        for map_size in map_sizes:
+            for population in populations:
+                process = context.Process(target=run_setting,
+                                          args=(map_size, population, gen_time, budget,
+                                                max_generations, results))
+                process.start()
+                setting = "map {}^2, population {}, gen_time {}".format(
+                    map_size, population, gen_time)
+                try:
+                    record = wait_for_record(process, results)
+                except RuntimeError as e:
+                    print(setting + ": failed, " + str(e))
+                    process.join()
+                    continue
+                process.join()
+
+                if record is None:
+                    print(setting + ": skipped, too many goombas for the map")
+                    continue
+                print(setting + ": {:.1f} steps/s, {:.1f} gens/hour, {:.0f} MB".format(
+                    record["steps_per_second"], record["gens_per_hour"],
+                    record["peak_rss_mb"]))
+                records.append(record)
+
+    return records
+
+def plot_records(records, directory):
+    """Plot each metric against population, with a line per map size and generation length."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping plots")
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    series = sorted({(record["map_size"], record["gen_time"]) for record in records})
+    phases = sorted({phase for record in records for phase in record["phase_seconds"]})
+
+    for metric in METRICS + phases:
+        fig, axes = plt.subplots()
+        for map_size, gen_time in series:
+            points = [(record["population"],
+                       record[metric] if metric in METRICS
+                       else record["phase_seconds"].get(metric, 0) / record["steps"])
+                      for record in records
+                      if record["map_size"] == map_size and record["gen_time"] == gen_time]
+            axes.plot(*zip(*points), marker="o",
+                      label="map {}^2, gen_time {}".format(map_size, gen_time))
+        axes.set_xscale("log")
+        axes.set_yscale("log")
+        axes.set_xlabel("population")
+        axes.set_ylabel(metric if metric in METRICS else metric + " (s per step)")
+        axes.legend(fontsize="small")
+        fig.savefig(os.path.join(directory, metric + ".png"))
+        plt.close(fig)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how evolution scales.")
+    parser.add_argument("output", help="file to write the results to, as JSON")
+    parser.add_argument("--plots", help="directory to write plots to")
+    parser.add_argument("--maps", type=int, nargs="+", default=MAP_SIZES)
+    parser.add_argument("--populations", type=int, nargs="+", default=POPULATIONS)
+    parser.add_argument("--gen-times", type=int, nargs="+", default=GEN_TIMES)
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET,
+                        help="seconds to run each setting for at most")
+    parser.add_argument("--generations", type=int, default=MAX_GENERATIONS,
+                        help="generations to run each setting for at most")
+    args = parser.parse_args()
+
+    records = run_grid(args.maps, args.populations, args.gen_times, args.budget,
+                       args.generations)
+    with open(args.output, "w") as out:
+        json.dump(records, out, indent=1)
+
+    if args.plots is not None:
+        plot_records(records, args.plots)
+
+
+if __name__ == "__main__":
+    main()
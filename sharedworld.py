@@ -0,0 +1,241 @@
+"""Step the goombas of one shared world in parallel worker processes.
+
+When goombas compete for the dirt of one map, each step is ordinarily taken goomba by
+goomba, each seeing the tiles left by those before it. Here the population is instead split
+into contiguous slices, one per worker process, and the map and each goomba's counts and
+position are kept in shared memory. A step is taken in three phases, in lockstep with the
+main process, which commands each worker over a pipe and waits for every one to reply:
+
+    1. Every worker senses, thinks and acts for its goombas against the map as it stood at the
+       start of the step. Moves and turns change nothing shared, so they are done at once;
+       sucks are only requested, with their chance of failure already drawn.
+    2. The main process merges the requested sucks in goomba order, so that goombas sucking
+       the same tile see each other's effects just as when stepped serially.
+    3. Every worker reads back its goombas' dirt, and publishes their counts and positions.
+
+Goombas thus see the tiles as of the start of a step rather than as left by the goombas
+before them. Each draws from its own generator: its stream, if the world is seeded, or else
+one seeded from the world's generator at the start of its generation. Either way a run is the
+same however many workers take it. A seeded world stepped serially also has every goomba
+sense before any acts, so that its run is the same as with workers; an unseeded one does not.
+
+Workers are forked, so that they inherit the settings of the Goomba and Genome classes. The
+main process waits on the workers' processes as well as their replies, so that if one dies,
+stepping fails at once with a RuntimeError naming it rather than waiting forever.
+"""
+
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+import random
+import numpy as np
+
+import world
+from goomba import Goomba, Action, Sensor, Count, suck_effect
+
+# The columns of the shared counts array, and of the status array.
+COUNTS = list(Count)
+DIRT = COUNTS.index(Count.Dirt)
+STATUS_COLUMNS = 4  # x, y, orientation x, orientation y
+
+# Commands the main process gives its workers.
+STEP = 0
+NEW_GENERATION = 1
+STOP = 2
+SUCKS_MERGED = 3
+
+
+class SharedGrid:
+    """A tile grid backed by an array in shared memory, indexed [x, y]."""
+
+    def __init__(self, tiles):
+        self.tiles = tiles
+        self.dimensions = tiles.shape
+
+    def set_tile(self, x, y, v):
+        if self.is_in_bounds(x, y):
+            self.tiles[x, y] = v
+
+    def get_tile(self, x, y):
+        if self.is_in_bounds(x, y):
+            return int(self.tiles[x, y])
+        return world.TileState.Boundary
+
+    def is_in_bounds(self, x, y):
+        return x >= 0 and x < self.dimensions[0] and y >= 0 and y < self.dimensions[1]
+
+
+class ParallelStepper:
+    """Steps the population of a world in a number of worker processes."""
+
+    # Seconds to wait for the workers' replies before giving up, or None to wait as long as
+    # every worker is alive.
+    REPLY_TIMEOUT = None
+
+    def __init__(self, wrld, num_workers):
+        self.world = wrld
+        num_goombas = len(wrld.goombas)
+
+        self.shared_memory = []
+        self.tiles = self.shared_array(wrld.dimensions, np.int8)
+        self.suck_pos = self.shared_array((num_goombas, 2), np.int32)
+        self.suck_failed = self.shared_array(num_goombas, np.bool_)
+        self.counts = self.shared_array((num_goombas, len(COUNTS)), np.int64)
+        self.status = self.shared_array((num_goombas, STATUS_COLUMNS), np.int32)
+        self.frozen = self.shared_array(num_goombas, np.bool_)
+
+        context = get_context('fork')
+        self.slices = np.array_split(np.arange(num_goombas), num_workers)
+        self.failed = False
+        self.pipes = []
+        self.workers = []
+        for indices in self.slices:
+            conn, worker_conn = context.Pipe()
+            worker = context.Process(target=self.work, args=(indices, worker_conn), daemon=True)
+            worker.start()
+            self.pipes.append(conn)
+            self.workers.append(worker)
+
+    def shared_array(self, shape, dtype):
+        """Allocate a zeroed array in shared memory."""
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        shm = SharedMemory(create=True, size=size)
+        self.shared_memory.append(shm)
+        array = np.ndarray(shape, dtype, buffer=shm.buf)
+        array[...] = 0
+        return array
+
+    def fail(self, message):
+        self.failed = True
+        raise RuntimeError(message)
+
+    def check_workers(self):
+        """Raise RuntimeError if any worker has died."""
+        for i, worker in enumerate(self.workers):
+            if worker.exitcode is not None:
+                self.fail("step worker " + str(i) + " exited with code " + str(worker.exitcode))
+
+    def command_workers(self, command):
+        self.check_workers()
+        for conn in self.pipes:
+            conn.send(command)
+
+    def await_workers(self):
+        """Wait for every worker to reply, raising RuntimeError if one dies first or they do
+        not all reply within REPLY_TIMEOUT."""
+        pending = set(self.pipes)
+        sentinels = {worker.sentinel: worker for worker in self.workers}
+        while pending:
+            ready = wait(list(pending) + list(sentinels), ParallelStepper.REPLY_TIMEOUT)
+            if not ready:
+                self.fail("step workers did not reply within " +
+                          str(ParallelStepper.REPLY_TIMEOUT) + "s")
+            for obj in ready:
+                if obj in sentinels:
+                    sentinels[obj].join()
+                    self.check_workers()
+                else:
+                    obj.recv()
+                    pending.discard(obj)
+
+    def start_generation(self):
+        """Hand the world's current population and map to the workers."""
+        goombas = self.world.goombas
+        self.tiles[...] = self.world.state
+        self.counts[...] = 0
+        self.suck_pos[...] = -1
+
+        rngs = [gmba.rng if gmba.rng is not random
+                else random.Random(self.world.rng.randrange(2**32)) for gmba in goombas]
+        self.command_workers(NEW_GENERATION)
+        for conn, indices in zip(self.pipes, self.slices):
+            conn.send([(goombas[i].genome.sequences(), goombas[i].pos, goombas[i].ori, rngs[i])
+                       for i in indices])
+
+    def step(self):
+        """Step every goomba once. Returns the number of frozen goombas skipped."""
+        self.frozen[:] = [gmba.frozen for gmba in self.world.goombas]
+        self.command_workers(STEP)
+        self.await_workers()
+        self.merge_sucks()
+        self.command_workers(SUCKS_MERGED)
+        self.await_workers()
+        return int(self.frozen.sum())
+
+    def merge_sucks(self):
+        """Apply this step's sucks to the map, in goomba order."""
+        for i in np.flatnonzero(self.suck_pos[:, 0] >= 0):
+            x, y = self.suck_pos[i]
+            tile_after, dirt_change = suck_effect(self.tiles[x, y], self.suck_failed[i],
+                                                  self.counts[i, DIRT])
+            if tile_after is not None:
+                self.tiles[x, y] = tile_after
+                self.world.state[x][y] = tile_after
+                self.counts[i, DIRT] += dirt_change
+
+    def sync(self):
+        """Bring the counts and positions of the world's goombas up to date."""
+        for gmba, counts, status in zip(self.world.goombas, self.counts.tolist(),
+                                        self.status.tolist()):
+            gmba.counts.update(zip(COUNTS, counts))
+            gmba.pos = (status[0], status[1])
+            gmba.ori = (status[2], status[3])
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        for conn, worker in zip(self.pipes, self.workers):
+            if self.failed:
+                # A surviving worker may be partway through a step.
+                worker.kill()
+            elif worker.exitcode is None:
+                conn.send(STOP)
+            worker.join()
+        for shm in self.shared_memory:
+            shm.close()
+            shm.unlink()
+
+    def work(self, indices, conn):
+        """The loop run by each worker over its slice of the population."""
+        grid = SharedGrid(self.tiles)
+        goombas = []
+
+        while True:
+            command = conn.recv()
+
+            if command == STOP:
+                return
+
+            if command == NEW_GENERATION:
+                goombas = []
+                for sequences, pos, ori, rng in conn.recv():
+                    gmba = Goomba.from_sequences(sequences, pos)
+                    gmba.ori = ori
+                    gmba.rng = rng
+                    goombas.append(gmba)
+                continue
+
+            for i, gmba in zip(indices, goombas):
+                self.suck_pos[i] = -1
+                if self.frozen[i]:
+                    continue
+                gmba.sense(grid)
+                gmba.think()
+                gmba.choose_action()
+                if gmba.intent == Action.Suck:
+                    gmba.sensors[Sensor.Bump] = 0
+                    failed = gmba.attempt_suck(grid)
+                    if failed is not None:
+                        self.suck_pos[i] = gmba.pos
+                        self.suck_failed[i] = failed
+                else:
+                    gmba.perform_action(grid)
+
+            conn.send(None)
+            conn.recv()
+
+            for i, gmba in zip(indices, goombas):
+                gmba.counts[Count.Dirt] = int(self.counts[i, DIRT])
+                self.counts[i] = [gmba.counts[count] for count in COUNTS]
+                self.status[i] = gmba.pos + gmba.ori
+
+            conn.send(None)
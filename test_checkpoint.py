@@ -0,0 +1,35 @@
+import random
+from random import Random
+
+import pytest
+
+from world import World
+from checkpoint import Checkpointer
+import benchmarks
+
+
+@pytest.mark.parametrize("seed, eval_seed", [(None, None), (3, None), (None, 5)])
+def test_resume_matches_uninterrupted(tmp_path, monkeypatch, seed, eval_seed):
+    """A world resumed from a checkpoint evolves exactly as one which was never stopped."""
+    monkeypatch.setattr(World, "CHECKPOINT_INTERVAL", 3)
+    random.seed(0)
+    genomes = benchmarks.population(benchmarks.benchmark_genome("seed"), Random(0), 20)
+    wrld = World((20, 20), genomes, benchmarks.META, [3, 10], 20, eval_seed, seed=seed)
+    wrld.checkpointer = Checkpointer(str(tmp_path))
+    while wrld.generation < 3:
+        wrld.step()
+
+    # Run on past the checkpoint at generation 3, without saving another.
+    while wrld.generation < 5:
+        wrld.step()
+    resumed = Checkpointer(str(tmp_path)).load()
+    assert resumed.generation == 3
+    while resumed.generation < 5:
+        resumed.step()
+
+    assert [gmba.genome.sequences() for gmba in resumed.goombas] == \
+        [gmba.genome.sequences() for gmba in wrld.goombas]
+    assert [champ.score() for champ in resumed.top_five] == \
+        [champ.score() for champ in wrld.top_five]
+    wrld.close()
+    resumed.close()
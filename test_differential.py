@@ -0,0 +1,6 @@
+import differential
+
+
+def test_batch_matches_reference():
+    """The batch backend thinks exactly as the reference interpreter on random genomes."""
+    assert differential.run_differential("batch", 20, seed=0) == (None, [])
@@ -0,0 +1,34 @@
+from random import Random
+
+import pytest
+
+from world import World
+from goomba import Goomba
+from genome import Genome
+import benchmarks
+
+
+def run_counts():
+    """The counts of a seeded world's goombas, and its champions', a few steps into its
+    third generation. The genomes are random, as the seed genome senses randomness and so
+    is never cached."""
+    rng = Random(0)
+    genomes = [Genome.random_coding(benchmarks.META, rng.randrange(3, 10), rng).sequences()
+               for _ in range(20)]
+    wrld = World((20, 20), genomes, benchmarks.META, [3, 10], gen_time=20, seed=0)
+    while wrld.generation < 2:
+        wrld.step()
+    for _ in range(5):
+        wrld.step()
+    counts = ([dict(gmba.counts) for gmba in wrld.goombas],
+              [dict(champ.counts) for champ in wrld.top_five])
+    wrld.close()
+    return counts
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_thought_cache_is_transparent(monkeypatch, shared):
+    """Recalling thoughts from the cache gives the same counts as thinking them again."""
+    uncached = run_counts()
+    monkeypatch.setattr(Goomba, "THOUGHT_CACHE_SIZE", 1000)
+    monkeypatch.setattr(Goomba, "THOUGHT_CACHE_SHARED", shared)
+    assert run_counts() == uncached
@@ -0,0 +1,49 @@
+from random import Random
+
+import pytest
+
+from world import World, random_map
+import benchmarks
+
+
+def test_race_small_gen_time(monkeypatch):
+    """Rungs which round to the same step are raced once, and the race can still be won."""
+    monkeypatch.setattr(World, "RACE_RUNGS", 3)
+    genomes = benchmarks.population(benchmarks.benchmark_genome("seed"), Random(0), 20)
+    wrld = World((20, 20), genomes, benchmarks.META, [3, 10], gen_time=4, seed=0)
+    assert wrld.race_checkpoints == [1, 2]
+
+    for _ in range(wrld.gen_time):
+        wrld.step()
+    finalists = [gmba for gmba in wrld.goombas if gmba.rung == len(wrld.race_checkpoints)]
+    assert len(finalists) == 5
+    wrld.close()
+
+
+def seeded_run(step_workers, monkeypatch):
+    """The counts of a seeded world's goombas, and its champions', a few steps into its
+    third generation."""
+    monkeypatch.setattr(World, "STEP_WORKERS", step_workers)
+    genomes = benchmarks.population(benchmarks.benchmark_genome("seed"), Random(0), 20)
+    wrld = World((20, 20), genomes, benchmarks.META, [3, 10], gen_time=20, seed=0)
+    while wrld.generation < 2:
+        wrld.step()
+    for _ in range(5):
+        wrld.step()
+    if wrld.stepper is not None:
+        wrld.stepper.sync()
+    counts = ([dict(gmba.counts) for gmba in wrld.goombas],
+              [dict(champ.counts) for champ in wrld.top_five])
+    wrld.close()
+    return counts
+
+def test_parallel_stepping_matches_serial(monkeypatch):
+    """A seeded world runs the same whether stepped serially or by workers."""
+    assert seeded_run(2, monkeypatch) == seeded_run(0, monkeypatch)
+
+def test_tiles_must_match_dimensions():
+    """A world refuses a map whose shape is not that of its dimensions."""
+    genomes = benchmarks.population(benchmarks.benchmark_genome("seed"), Random(0), 5)
+    tiles = random_map((20, 15), Random(0))
+    with pytest.raises(ValueError):
+        World((15, 20), genomes, benchmarks.META, [3, 10], tiles=tiles)
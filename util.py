@@ -1,7 +1,9 @@
 """Utilities that belong nowhere else."""
-from random import random
+from collections import OrderedDict
+import random
+import numpy as np
 
-def weighted_choice(weighted_items, num_items=1):
+def weighted_choice(weighted_items, num_items=1, rng=random):
     """Take a dict mapping items to weights, return a weighted random choice of the objects."""
     total = 0
     cume_list = []
@@ -16,7 +18,7 @@ def weighted_choice(weighted_items, num_items=1):
     items = []
 
     for _ in range(num_items):
-        rand = random()
+        rand = rng.random()
 
         for item, val in cume_list:
             if rand <= val:
@@ -29,3 +31,85 @@ def weighted_choice(weighted_items, num_items=1):
         return items[0]
 
     return items
+
+
+class LRUCache(object):
+    """A bounded mapping that evicts its least-recently-used entries, counting hits and misses."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return the value stored under key, marking it recently-used, or default if absent."""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least-recently-used entry if the cache is full."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Discard all entries and statistics."""
+        self.entries.clear()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        """The fraction of lookups since the statistics were last reset which were hits."""
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+class CounterStream:
+    """A reproducible stream of random numbers for one individual, such as a goomba.
+
+    A stream is selected by a seed and up to three integer ids, such as a generation and an
+    index in the population, which fix the starting counter of NumPy's counter-based Philox
+    generator. Streams so identified never overlap, and may be created in any order and in
+    any process. Numbers are drawn from NumPy in batches of BATCH_SIZE.
+
+    Supports the methods of random.Random which goombas use."""
+
+    BATCH_SIZE = 256
+
+    def __init__(self, seed, *ids):
+        counter = [0] + list(ids) + [0] * (3 - len(ids))
+        self.generator = np.random.Generator(np.random.Philox(key=seed, counter=counter))
+        self.batch = []
+
+    def random(self):
+        if not self.batch:
+            # Reversed, so that values are popped in the order they were drawn.
+            self.batch = self.generator.random(CounterStream.BATCH_SIZE)[::-1].tolist()
+        return self.batch.pop()
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
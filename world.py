@@ -1,27 +1,157 @@
 """Store information about the world the goombas inhabit, and manage their populations."""
 
+import gc
+import random
+from time import perf_counter
 from enum import IntEnum
-from random import choice, sample, randrange
+from random import Random
 from math import ceil
-from numpy import linspace
+from numpy import linspace, percentile
 
-from goomba import Goomba, breed
+from goomba import Goomba, Count, offspring_genome
 from genome import Genome
-from util import weighted_choice
+from util import weighted_choice, LRUCache, CounterStream
+import sharedworld
 
 class TileState(IntEnum):
     Boundary = -1
     Clean = 0
     Dirty = 1
 
-class World:
-    """Contains the world state, a population of goombas, and the means of breeding them"""
+def random_map(dimensions, rng=random):
+    """Generate the tiles of a random map of the given dimensions, enclosed by a boundary."""
+    width = dimensions[0]
+    height = dimensions[1]
+
+    distrib = [TileState.Boundary]*2 + [TileState.Dirty] + [TileState.Clean]*7
+
+    state = [[rng.choice(distrib) for _ in range(height)] for _ in range(width)]
+
+    for i in range(width):
+        state[i][0] = TileState.Boundary
+        state[i][height-1] = TileState.Boundary
+    for j in range(height):
+        state[0][j] = TileState.Boundary
+        state[width-1][j] = TileState.Boundary
+
+    return state
+
+def tile_columns(tiles):
+    """A mutable copy of a map's tiles as lists of columns, whether the map is held as
+    sequences of columns or as an array such as one from a map bank."""
+    if hasattr(tiles, "tolist"):
+        return tiles.tolist()
+    return [list(column) for column in tiles]
+
+def clean_tiles(state):
+    """Return the coordinates of every clean tile of a map."""
+    tiles = []
+    for y in range(len(state[0])):
+        for x in range(len(state)):
+            if state[x][y] == TileState.Clean:
+                tiles.append((x, y))
+    return tiles
+
+
+class TileGrid:
+    """A rectangular grid of tiles, indexed as state[x][y]."""
+
+    def set_tile(self, x, y, v):
+        if self.is_in_bounds(x, y):
+            self.state[x][y] = v
+
+    def get_tile(self, x, y):
+        if self.is_in_bounds(x, y):
+            return self.state[x][y]
+        return TileState.Boundary
+
+    def is_in_bounds(self, x, y):
+        return x >= 0 and x < self.dimensions[0] and y >= 0 and y < self.dimensions[1]
+
+
+class Arena(TileGrid):
+    """A private copy of a map, in which a single goomba is evaluated in isolation."""
+
+    def __init__(self, initial_state):
+        self.dimensions = (len(initial_state), len(initial_state[0]))
+        self.initial_state = initial_state
+        self.state = tile_columns(initial_state)
+
+    def reset(self):
+        """Restore every tile to its state when the world was generated."""
+        for column, initial_column in zip(self.state, self.initial_state):
+            column[:] = initial_column
+
+
+class World(TileGrid):
+    """Contains the world state, a population of goombas, and the means of breeding them.
+
+    Ordinarily all goombas share one map and compete for its dirt. If an eval_seed is given,
+    each goomba is instead evaluated alone in its own arena, from a common start location,
+    drawing from its own generator seeded with eval_seed. A goomba's fitness then depends
+    only on its genome, so the fitness of genomes already seen on this map is looked up in
+    a cache of FITNESS_CACHE_SIZE entries rather than simulated again, and of identical
+    genomes in one generation only the first is simulated.
+
+    Ordinarily all random draws are made from the global generator. If a seed is given,
+    the world instead makes its own draws, for its map, start locations and breeding, from
+    a generator seeded with it, and each goomba in a shared map draws from its own stream,
+    identified by the seed, its generation and its index in the population. A seeded run
+    is then reproducible whatever else uses the global generator, and whichever process
+    steps each goomba."""
     CLONE_BEST_FRACTION = 0.05
     BREED_FRACTION = 0.5
     REPRO_SUCCESS_RAMP = 5
     NEW_RANDOM_FRACTION = 0.01
 
-    def __init__(self, dimensions, goomba_genomes, seed_meta, gen_len_range, gen_time=200):
+    # Parsimony pressure in selection, against genome bloat. With "lexicographic", goombas of
+    # equal score rank smaller genome first. With "double_tournament", each parent is instead
+    # chosen from two winners of tournaments on score among FITNESS_TOURNAMENT_SIZE breeders:
+    # the one with the smaller genome with probability SIZE_TOURNAMENT_PRESSURE, else the other.
+    PARSIMONY = None
+    FITNESS_TOURNAMENT_SIZE = 3
+    SIZE_TOURNAMENT_PRESSURE = 0.7
+
+    # Goombas and genomes contain no reference cycles, so discarded generations are freed by
+    # refcounting alone; the cyclic collector can be switched off while stepping, or tuned
+    # by supplying thresholds as for gc.set_threshold.
+    GC_WHILE_STEPPING = True
+    GC_THRESHOLDS = None
+
+    FITNESS_CACHE_SIZE = 10000
+
+    # Early stopping: every EARLY_STOP_INTERVAL steps, freeze goombas which have not moved
+    # after EARLY_STOP_IDLE_STEPS steps (None disables), and if EARLY_STOP_HOPELESS, those
+    # whose best possible final score falls short of the score currently needed to breed.
+    # Frozen goombas are not stepped again this generation. Other goombas' scores may yet
+    # fall, so the latter is a heuristic rather than a guarantee.
+    EARLY_STOP_IDLE_STEPS = None
+    EARLY_STOP_HOPELESS = False
+    EARLY_STOP_INTERVAL = 10
+
+    # Racing evaluation by successive halving: if RACE_RUNGS is positive, goombas are raced
+    # at gen_time / RACE_ETA**RACE_RUNGS steps, gen_time / RACE_ETA**(RACE_RUNGS - 1) steps,
+    # and so on; at each rung only the best 1 / RACE_ETA of those still racing carry on, and
+    # the rest are frozen. Goombas are ranked by the rung they reached, then by score.
+    RACE_RUNGS = 0
+    RACE_ETA = 2
+
+    # Step times are recorded in a histogram of power-of-two buckets of microseconds:
+    # bucket i counts steps taking less than 2**(i + 1) microseconds.
+    STEP_HISTOGRAM_BUCKETS = 40
+
+    # Parallel stepping: if STEP_WORKERS is positive, a world whose goombas share its map is
+    # stepped by that many worker processes, as described in sharedworld. The goombas' counts
+    # and positions are then only brought up to date when they are next needed for freezing
+    # or breeding.
+    STEP_WORKERS = 0
+
+    # A world given a checkpointer, as from the checkpoint module, saves its state to it at the
+    # start of every CHECKPOINT_INTERVAL generations.
+    CHECKPOINT_INTERVAL = 10
+
+    def __init__(self, dimensions, goomba_genomes, seed_meta, gen_len_range, gen_time=200,
+                 eval_seed=None, tiles=None, seed=None):
         self.dimensions = dimensions
         width = dimensions[0]
         height = dimensions[1]
@@ -30,19 +160,22 @@ class World:
         self.gen_len_range = gen_len_range
 
         self.gen_time = gen_time
+        if World.GC_THRESHOLDS is not None:
+            gc.set_threshold(*World.GC_THRESHOLDS)
         self.steps = 0
         self.generation = 0
 
-        distrib = [TileState.Boundary]*2 + [TileState.Dirty] + [TileState.Clean]*7
+        self.seed = seed
+        self.rng = random if seed is None else Random(seed)
 
-        self.state = [[choice(distrib) for _ in range(width)] for _ in range(height)]
-
-        for i in range(width):
-            self.state[i][0] = TileState.Boundary
-            self.state[i][height-1] = TileState.Boundary
-        for j in range(height):
-            self.state[0][j] = TileState.Boundary
-            self.state[width-1][j] = TileState.Boundary
+        # A map of the given dimensions, such as one from a map bank, may be supplied.
+        if tiles is None:
+            self.state = random_map(dimensions, self.rng)
+        else:
+            self.state = tile_columns(tiles)
+            if len(self.state) != width or any(len(column) != height for column in self.state):
+                raise ValueError("tiles do not match the world's dimensions " +
+                                 str(tuple(dimensions)))
 
         self.init_dirt_distrib = []
 
@@ -51,68 +184,264 @@ class World:
                 if self.state[x][y] == TileState.Dirty:
                     self.init_dirt_distrib.append((x, y))
 
+        self.initial_state = [tuple(column) for column in self.state]
+        self.map_id = hash(tuple(self.initial_state))
+
+        self.eval_seed = eval_seed
+        self.fitness_cache = LRUCache(World.FITNESS_CACHE_SIZE)
+        self.fitness_hits = 0
+        self.skipped_steps = 0
+
+        self.step_histogram = [0] * World.STEP_HISTOGRAM_BUCKETS
+
+        # In a short generation several rungs may round to the same step; they are raced once.
+        self.race_checkpoints = sorted({max(1, round(gen_time / World.RACE_ETA**k))
+                                        for k in range(World.RACE_RUNGS, 0, -1)})
+
+        if self.is_isolated():
+            self.eval_start = Random(eval_seed).choice(clean_tiles(self.state))
+            starts = [self.eval_start] * len(goomba_genomes)
+        else:
+            starts = self.start_locations(len(goomba_genomes))
+        self.goombas = [Goomba.from_sequences(s, p, self.goomba_rng(self.generation, i))
+                        for i, (s, p) in enumerate(zip(goomba_genomes, starts))]
+        if self.is_isolated():
+            self.arenas = [Arena(self.initial_state) for _ in self.goombas]
+        else:
+            self.arenas = None
 
-        starts = self.start_locations(len(goomba_genomes))
-        self.goombas = [Goomba.from_sequences(s, p) for s, p in zip(goomba_genomes, starts)]
         self.top_five = self.goombas[:5]
+        self.recall_fitnesses()
+        self.checkpointer = None
+
+        # Given a sink, as from the metrics module, a summary of each generation is emitted to
+        # it rather than printed.
+        self.metrics = None
+        self.gen_start_time = perf_counter()
+
+        # Given a monitor, as from the memtrace module, memory is accounted for each time a
+        # generation has been replaced.
+        self.memory_monitor = None
+
+        self.stepper = None
+        if World.STEP_WORKERS > 0 and not self.is_isolated():
+            self.stepper = sharedworld.ParallelStepper(self, World.STEP_WORKERS)
+            self.stepper.start_generation()
+
         self.running = True
 
     @classmethod
-    def random_goombas(cls, dimensions, num_goombas, seed_meta, gen_len_range, gen_time=200):
+    def random_goombas(cls, dimensions, num_goombas, seed_meta, gen_len_range, gen_time=200,
+                       eval_seed=None, tiles=None, seed=None):
         """Generate a world containing a number of goombas with random coding genomes."""
-
-        gens = [Genome.random_coding(seed_meta, randrange(*gen_len_range)) \
+        rng = random if seed is None else Random(seed)
+        gens = [Genome.random_coding(seed_meta, rng.randrange(*gen_len_range), rng) \
                 for _ in range(num_goombas)]
         gen_seqs = [genome.sequences() for genome in gens]
-        return cls(dimensions, gen_seqs, seed_meta, gen_len_range, gen_time)
+        return cls(dimensions, gen_seqs, seed_meta, gen_len_range, gen_time, eval_seed, tiles,
+                   seed)
+
+    def goomba_rng(self, generation, index):
+        """The generator for the goomba at index in a generation, or None for the global one."""
+        if self.is_isolated():
+            return Random(self.eval_seed)
+        if self.seed is not None:
+            return CounterStream(self.seed, generation, index)
+        return None
+
+    def is_isolated(self):
+        """Whether goombas are evaluated alone in their own arenas with seeded generators."""
+        return self.eval_seed is not None
+
+    def fitness_key(self, gmba):
+        """The key under which a goomba's final counts are cached: its genome and the
+        conditions of its evaluation."""
+        return (tuple(gmba.genome.sequences()), self.map_id, self.eval_seed, self.gen_time)
+
+    def recall_fitnesses(self):
+        """Freeze any goomba whose genome has already been evaluated, with its cached counts,
+        and any twin of a goomba evaluated earlier in the population, to share its counts.
+
+        Only meaningful in isolated evaluation, where fitness is a function of the genome."""
+        self.fitness_keys = None
+        self.twins = []
+        if not self.is_isolated():
+            return
+
+        self.fitness_keys = [self.fitness_key(gmba) for gmba in self.goombas]
+        evaluated = {}
+        for gmba, key in zip(self.goombas, self.fitness_keys):
+            counts = self.fitness_cache.get(key)
+            if counts is not None:
+                gmba.counts.update(counts)
+                gmba.frozen = True
+                gmba.rung = len(self.race_checkpoints)
+            elif key in evaluated:
+                gmba.frozen = True
+                self.twins.append((gmba, evaluated[key]))
+            else:
+                evaluated[key] = gmba
+
+    def share_twin_counts(self):
+        """Bring each twin's counts and rung up to those of the goomba evaluated for it."""
+        for twin, original in self.twins:
+            twin.counts.update(original.counts)
+            twin.rung = original.rung
+
+    def remember_fitnesses(self):
+        """Cache the final counts of every goomba evaluated this generation."""
+        if not self.is_isolated():
+            return
+
+        # Twins are evaluated once, so count as hits too.
+        self.fitness_hits = self.fitness_cache.hits + len(self.twins)
+        self.fitness_cache.reset_stats()
+        for gmba, key in zip(self.goombas, self.fitness_keys):
+            if not gmba.frozen:
+                self.fitness_cache.put(key, dict(gmba.counts))
 
     def start_locations(self, num_starts):
         """Return a list of coordinates of free starting locations in the current world."""
-        poss_starts = []
-        for y in range(self.dimensions[1]):
-            for x in range(self.dimensions[0]):
-                if self.state[x][y] == TileState.Clean:
-                    poss_starts.append((x, y))
-
-        return sample(poss_starts, num_starts)
+        return self.rng.sample(clean_tiles(self.state), num_starts)
 
     def reset_dirt(self):
         """Reset the dirt distribution to the way it was when the world was initially generated."""
         for x, y in self.init_dirt_distrib:
             self.state[x][y] = TileState.Dirty
 
-    def set_tile(self, x, y, v):
-        if self.is_in_bounds(x, y):
-            self.state[x][y] = v
-
-    def get_tile(self, x, y):
-        if self.is_in_bounds(x, y):
-            return self.state[x][y]
-        return TileState.Boundary
-
-    def is_in_bounds(self, x, y):
-        return x >= 0 and x < self.dimensions[0] and y >= 0 and y < self.dimensions[1]
+        if self.is_isolated():
+            for arena in self.arenas:
+                arena.reset()
 
     def step(self):
         """Step the world once, moving all goombas within it."""
         if self.running:
             self.steps += 1
 
-            for goomba in self.goombas:
-                goomba.sense(self)
-                goomba.think()
-                goomba.choose_action()
-                goomba.perform_action(self)
+            gc_was_enabled = gc.isenabled()
+            if not World.GC_WHILE_STEPPING:
+                gc.disable()
+
+            start_time = perf_counter()
+
+            try:
+                if self.stepper is not None:
+                    self.skipped_steps += self.stepper.step()
+                else:
+                    arenas = self.arenas if self.is_isolated() else [self] * len(self.goombas)
+                    # A seeded world's goombas all sense the map as it stood at the start of
+                    # the step, as when stepped in parallel, so that a run is the same however
+                    # many workers take it, if any.
+                    snapshot = self.seed is not None and not self.is_isolated()
+                    if snapshot:
+                        for goomba in self.goombas:
+                            if not goomba.frozen:
+                                goomba.sense(self)
+                    for goomba, arena in zip(self.goombas, arenas):
+                        if goomba.frozen:
+                            self.skipped_steps += 1
+                            continue
+                        if not snapshot:
+                            goomba.sense(arena)
+                        goomba.think()
+                        goomba.choose_action()
+                        goomba.perform_action(arena)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+
+            self.record_step_time(perf_counter() - start_time)
+
+            if self.stepper is not None and (self.steps % World.EARLY_STOP_INTERVAL == 0 or
+                                             self.steps in self.race_checkpoints or
+                                             self.steps > self.gen_time):
+                self.stepper.sync()
+
+            if self.twins and (self.steps % World.EARLY_STOP_INTERVAL == 0 or
+                               self.steps in self.race_checkpoints or
+                               self.steps > self.gen_time):
+                self.share_twin_counts()
+
+            if self.steps % World.EARLY_STOP_INTERVAL == 0:
+                self.freeze_hopeless()
+
+            if self.steps in self.race_checkpoints:
+                self.race(self.race_checkpoints.index(self.steps))
 
             if self.steps > self.gen_time:
                 self.next_gen()
 
+    def record_step_time(self, seconds):
+        micros = max(1, int(seconds * 1e6))
+        bucket = min(micros.bit_length() - 1, World.STEP_HISTOGRAM_BUCKETS - 1)
+        self.step_histogram[bucket] += 1
+
+    def step_time_percentile(self, percentile):
+        """An upper bound in seconds on the given percentile of recorded step times."""
+        total = sum(self.step_histogram)
+        if total == 0:
+            return 0.0
+
+        cumulative = 0
+        for bucket, count in enumerate(self.step_histogram):
+            cumulative += count
+            if cumulative >= total * percentile / 100:
+                return 2**(bucket + 1) / 1e6
+        return 2**World.STEP_HISTOGRAM_BUCKETS / 1e6
+
+    def freeze_hopeless(self):
+        """Apply the early stopping policy, freezing goombas not worth stepping further."""
+        # Goombas are stepped until steps exceeds gen_time.
+        remaining = self.gen_time + 1 - self.steps
+
+        if World.EARLY_STOP_IDLE_STEPS is not None and self.steps >= World.EARLY_STOP_IDLE_STEPS:
+            for gmba in self.goombas:
+                if not gmba.has_moved():
+                    gmba.frozen = True
+
+        if World.EARLY_STOP_HOPELESS:
+            num_bred = ceil(len(self.goombas) * World.BREED_FRACTION)
+            scores = sorted((gmba.score() for gmba in self.goombas), reverse=True)
+            threshold = scores[num_bred - 1]
+            for gmba in self.goombas:
+                if gmba.score_bound(remaining) < threshold:
+                    gmba.frozen = True
+
+    def race(self, rung):
+        """Let the best of the goombas still racing at a rung carry on, freezing the rest."""
+        racers = [gmba for gmba in self.goombas if gmba.rung == rung and not gmba.frozen]
+        racers.sort(key=lambda g: g.score(), reverse=True)
+
+        num_survivors = ceil(len(racers) / World.RACE_ETA)
+        for gmba in racers[:num_survivors]:
+            gmba.rung += 1
+        for gmba in racers[num_survivors:]:
+            gmba.frozen = True
+
+    def rank(self, gmba):
+        """The key by which goombas are ordered for selection."""
+        if World.PARSIMONY == "lexicographic":
+            return (gmba.rung, gmba.score(), -gmba.counts[Count.GenomeSize])
+        return (gmba.rung, gmba.score())
+
+    def double_tournament(self, candidates):
+        """Select a parent by tournament on score, then between two winners on genome size."""
+        tournament_size = min(World.FITNESS_TOURNAMENT_SIZE, len(candidates))
+        winners = [max(self.rng.sample(candidates, tournament_size), key=self.rank)
+                   for _ in range(2)]
+        winners.sort(key=lambda gmba: gmba.counts[Count.GenomeSize])
+        if self.rng.random() < World.SIZE_TOURNAMENT_PRESSURE:
+            return winners[0]
+        return winners[1]
+
     def next_gen(self):
-        """Evaluate all goomba scores, breed them, print metrics, reset state for next round."""
+        """Evaluate all goomba scores, breed them, report metrics, reset state for next round."""
         self.running = False
-        print("Generation " + str(self.generation))
         newtops = list(self.top_five)
         for goomba in self.goombas:
+            # Only goombas which ran the full race have comparable scores.
+            if goomba.rung < len(self.race_checkpoints):
+                continue
             for champ in self.top_five:
                 if goomba.score() > champ.score():
                     newtops.append(goomba)
@@ -121,20 +450,147 @@ class World:
         newtops = sorted(newtops, key=lambda goomba: goomba.score(), reverse=True)
         self.top_five = newtops[:5]
 
+        # Scores are final, so the next generation can be bred.
+        breeding = self.start_breeding()
+
+        hits, lookups = self.thought_cache_stats()
+        self.remember_fitnesses()
+
+        if self.metrics is not None:
+            self.metrics.emit(self.generation_record(hits, lookups))
+        else:
+            self.print_report(hits, lookups)
+        self.skipped_steps = 0
+
+        # Reset the map before the new goombas are placed, so that they start on clean tiles
+        # of the map they will run on.
+        self.steps = 0
+        self.reset_dirt()
+
+        self.populate(breeding)
+        if self.memory_monitor is not None:
+            self.memory_monitor.record(self)
+        self.generation += 1
+        self.recall_fitnesses()
+        if self.checkpointer is not None and self.generation % World.CHECKPOINT_INTERVAL == 0:
+            self.checkpointer.save(self)
+        if self.stepper is not None:
+            self.stepper.start_generation()
+        self.gen_start_time = perf_counter()
+        self.running = True
+
+    def print_report(self, thought_hits, thought_lookups):
+        """Print the champions and statistics of the generation just evaluated."""
+        print("Generation " + str(self.generation))
+
         for champ in self.top_five:
             print(champ.genome.sequences())
             print(champ.counts)
             print(champ.score())
             print()
 
-        self.breed_pop()
-        self.steps = 0
-        self.generation += 1
-        self.reset_dirt()
-        self.running = True
+        if thought_lookups > 0:
+            print("Thought cache hit rate: " + str(thought_hits / thought_lookups))
+            print()
+
+        if self.is_isolated():
+            print("Fitness cache hits: " + str(self.fitness_hits))
+            print()
+
+        print("Step time p50, p99, p99.9 (s): " +
+              " ".join(str(self.step_time_percentile(p)) for p in (50, 99, 99.9)))
+        print()
+
+        if self.skipped_steps > 0:
+            total_steps = len(self.goombas) * self.steps
+            print("Goomba steps skipped: " + str(self.skipped_steps) + " of " + str(total_steps))
+            print()
+
+    def generation_record(self, thought_hits, thought_lookups):
+        """Summarise the generation just evaluated as a flat record for a metrics sink."""
+        # Motionless goombas are given a sentinel score, which would swamp the distribution.
+        scores = [gmba.score() for gmba in self.goombas if gmba.has_moved()]
+        quartiles = [float(q) for q in percentile(scores, [0, 25, 50, 75, 100])] \
+            if scores else [None] * 5
+        goomba_steps = len(self.goombas) * self.steps - self.skipped_steps
+        thoughts = sum(gmba.counts[Count.Thoughts] for gmba in self.goombas)
+
+        return {"generation": self.generation,
+                "population": len(self.goombas),
+                "motionless": len(self.goombas) - len(scores),
+                "score_min": quartiles[0],
+                "score_p25": quartiles[1],
+                "score_median": quartiles[2],
+                "score_p75": quartiles[3],
+                "score_max": quartiles[4],
+                "champion_score": self.top_five[0].score(),
+                "mean_genome_size": sum(gmba.counts[Count.GenomeSize]
+                                        for gmba in self.goombas) / len(self.goombas),
+                "thoughts_per_step": thoughts / goomba_steps if goomba_steps else None,
+                "steps_per_second": self.steps / (perf_counter() - self.gen_start_time),
+                "dirt_remaining": self.dirt_remaining(),
+                "skipped_steps": self.skipped_steps,
+                "thought_cache_hit_rate":
+                    thought_hits / thought_lookups if thought_lookups else None,
+                "fitness_cache_hits": self.fitness_hits if self.is_isolated() else None,
+                "step_time_p50": self.step_time_percentile(50),
+                "step_time_p99": self.step_time_percentile(99),
+                "step_time_p99_9": self.step_time_percentile(99.9)}
+
+    def dirt_remaining(self):
+        """The number of dirty tiles left on the map, averaged over arenas if isolated."""
+        grids = self.arenas if self.is_isolated() else [self]
+        dirt = sum(column.count(TileState.Dirty) for grid in grids for column in grid.state)
+        return dirt / len(grids)
+
+    def thought_cache_stats(self):
+        """Return total thought cache hits and lookups this generation, resetting the counts."""
+        caches = {id(gmba.thought_cache): gmba.thought_cache
+                  for gmba in self.goombas if gmba.thought_cache is not None}
+        hits = 0
+        lookups = 0
+        for cache in caches.values():
+            hits += cache.hits
+            lookups += cache.hits + cache.misses
+            cache.reset_stats()
+        return hits, lookups
+
+    def emigrants(self, num_migrants):
+        """Return the genome sequences of up to num_migrants of the best goombas found so far."""
+        return [champ.genome.sequences() for champ in self.top_five[:num_migrants]]
+
+    def immigrate(self, genome_sequences):
+        """Replace the last goombas of the current generation with immigrant genomes.
+
+        Call this between generations. The tail of the population holds bred children and
+        random newcomers, so the clones of this world's own champions are kept."""
+        genome_sequences = genome_sequences[:len(self.goombas)]
+        first = len(self.goombas) - len(genome_sequences)
+        for i, sequences in enumerate(genome_sequences, first):
+            gmba = self.goombas[i]
+            gmba.reset(Genome(*sequences), gmba.pos, self.goomba_rng(self.generation, i))
+
+        self.recall_fitnesses()
+        if self.stepper is not None:
+            self.stepper.start_generation()
 
     def breed_pop(self):
         """Breed the current population, a better score rank means probably more children."""
+        self.populate(self.start_breeding())
+
+    def close(self):
+        """Shut down the stepping workers and metrics sink, if there are any."""
+        if self.stepper is not None:
+            self.stepper.close()
+            self.stepper = None
+        if self.metrics is not None:
+            self.metrics.close()
+            self.metrics = None
+
+    def start_breeding(self):
+        """Select the next generation's parents and breed their genomes.
+
+        Returns the genomes of the clones, of the bred children and of the random newcomers."""
         pop_size = len(self.goombas)
         num_clones = ceil(pop_size * World.CLONE_BEST_FRACTION)
         num_bred = ceil(pop_size * World.BREED_FRACTION)
@@ -142,28 +598,58 @@ class World:
 
         # Order the population by final score
         ordered_pop = sorted([gmba for gmba in self.goombas],
-                             key=lambda g: g.score(),
+                             key=self.rank,
                              reverse=True)
 
         # The top few will be cloned into the next generation unchanged
         top_dogs = ordered_pop[:num_clones]
-        new_goombas = [Goomba.from_sequences(dog.genome.sequences()) for dog in top_dogs]
+        clones = [Genome(*dog.genome.sequences()) for dog in top_dogs]
 
         # The bottom fraction is thrown out entirely
         breeders = ordered_pop[:num_bred]
 
         # The remaining goombas breed, with a higher likelihood as they rank higher
-        breed_weighted = dict(zip(breeders, linspace(World.REPRO_SUCCESS_RAMP, 1, len(breeders))))
-        breeding_pairs = weighted_choice(breed_weighted, 2 * (pop_size - (num_clones + num_rand)))
-        for i in range(0, len(breeding_pairs), 2):
-            new_goombas.append(breed(breeding_pairs[i], breeding_pairs[i + 1]))
-
-        for i in range(num_rand):
-            new_goombas.append(Goomba(Genome.random_coding(self.seed_meta,
-                                                           randrange(*self.gen_len_range))))
-
-        starts = self.start_locations(len(new_goombas))
-        for gmba, pos in zip(new_goombas, starts):
-            gmba.pos = pos
+        num_parents = 2 * (pop_size - (num_clones + num_rand))
+        if World.PARSIMONY == "double_tournament":
+            breeding_pairs = [self.double_tournament(breeders) for _ in range(num_parents)]
+        else:
+            breed_weighted = dict(zip(breeders,
+                                      linspace(World.REPRO_SUCCESS_RAMP, 1, len(breeders))))
+            breeding_pairs = weighted_choice(breed_weighted, num_parents, self.rng)
+        mums = breeding_pairs[0::2]
+        dads = breeding_pairs[1::2]
+
+        children = [offspring_genome(mum, dad, self.rng) for mum, dad in zip(mums, dads)]
+
+        newcomers = [Genome.random_coding(self.seed_meta,
+                                          self.rng.randrange(*self.gen_len_range), self.rng)
+                     for _ in range(num_rand)]
+
+        return clones, children, newcomers
+
+    def populate(self, breeding):
+        """Reset the population in place with the genomes returned by start_breeding."""
+        clones, children, newcomers = breeding
+        new_genomes = clones + children + newcomers
+
+        # Only once every child genome exists can the parents be recycled: the current
+        # population is reset in place with the new genomes, except for the champions,
+        # which must outlive their generation.
+        shells = [gmba for gmba in self.goombas
+                  if not any(gmba is champ for champ in self.top_five)]
+        shells.reverse()
+
+        new_goombas = []
+        if self.is_isolated():
+            starts = [self.eval_start] * len(new_genomes)
+        else:
+            starts = self.start_locations(len(new_genomes))
+        for i, (gen, pos) in enumerate(zip(new_genomes, starts)):
+            # The population is bred at the end of a generation, for the next.
+            rng = self.goomba_rng(self.generation + 1, i)
+            if shells:
+                new_goombas.append(shells.pop().reset(gen, pos, rng))
+            else:
+                new_goombas.append(Goomba(gen, pos, rng))
 
         self.goombas = new_goombas